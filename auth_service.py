@@ -1,15 +1,154 @@
 import smtplib
 import os
 import random
+import threading
+import time
+from collections import deque
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from mail_queue import MailOutbox
+
+# Errors after which a session is unusable and the message is worth one retry on a fresh one
+_RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class SMTPSessionPool:
+    """Keeps authenticated SMTP sessions open and reuses them across messages.
+
+    The TLS handshake and AUTH happen once per session instead of once per
+    message. Sessions idle for longer than `idle_timeout` are closed and
+    reopened rather than reused, since providers drop idle connections
+    (Gmail after a few minutes). A send that finds its session dead
+    reconnects and retries once. A session is recycled after `max_messages`
+    to stay under per-connection provider limits. At most `size` sessions
+    exist at a time; extra senders wait for one.
+    """
+
+    def __init__(self, connect, size=2, idle_timeout=60.0, max_messages=100):
+        self.connect = connect
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self._idle = deque()  # (server, last_used, messages_sent)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.opened = 0
+        self.reused = 0
+        self.reconnects = 0
+        self.sent = 0
+
+    def _open(self):
+        server = self.connect()
+        with self._lock:
+            self.opened += 1
+        return server, 0
+
+    def _checkout(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                return self._open()
+            server, last_used, count = entry
+            if now - last_used < self.idle_timeout and count < self.max_messages:
+                with self._lock:
+                    self.reused += 1
+                return server, count
+            self._quit(server)
+
+    def _checkin(self, server, count):
+        with self._lock:
+            self._idle.append((server, time.monotonic(), count))
+
+    def _quit(self, server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def send_many(self, messages):
+        """Sends messages over one session; returns a list of True/exception per message."""
+        results = []
+        with self._slots:
+            server, count = self._checkout()
+            try:
+                for msg in messages:
+                    if count >= self.max_messages:
+                        self._quit(server)
+                        server, count = self._open()
+                    try:
+                        try:
+                            server.send_message(msg)
+                        except _RECONNECT_ERRORS:
+                            self._quit(server)
+                            with self._lock:
+                                self.reconnects += 1
+                            server, count = self._open()
+                            server.send_message(msg)
+                        count += 1
+                        results.append(True)
+                    except smtplib.SMTPRecipientsRefused as e:
+                        # Per-recipient rejection; the session itself is fine
+                        results.append(e)
+                    except smtplib.SMTPResponseException as e:
+                        server.rset()
+                        results.append(e)
+            except BaseException:
+                self._quit(server)
+                raise
+            self._checkin(server, count)
+        with self._lock:
+            self.sent += sum(1 for r in results if r is True)
+        return results
+
+    def send(self, msg):
+        result = self.send_many([msg])[0]
+        if result is not True:
+            raise result
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for server, _, _ in idle:
+            self._quit(server)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "opened": self.opened,
+                "reused": self.reused,
+                "reconnects": self.reconnects,
+                "sent": self.sent,
+            }
+
 
 class AuthService:
     def __init__(self):
         self.email = os.environ.get("TS_EMAIL")
         self.password = os.environ.get("TS_PASSWORD")
-        self.smtp_server = "smtp.gmail.com"
-        self.smtp_port = 465
+        self.smtp_server = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+        self.smtp_port = int(os.environ.get("SMTP_PORT", "465"))
+        # Set SMTP_SSL=0 for a plain local relay or test stand-in
+        self.smtp_ssl = os.environ.get("SMTP_SSL", "1") == "1"
+        self.smtp_pool = SMTPSessionPool(
+            self._open_smtp_session,
+            size=int(os.environ.get("SMTP_POOL_SIZE", "2")),
+            idle_timeout=float(os.environ.get("SMTP_IDLE_TIMEOUT", "60")),
+            max_messages=int(os.environ.get("SMTP_MAX_MESSAGES_PER_SESSION", "100")),
+        )
+        # Notifications go through a disk-backed queue so requests never wait on SMTP
+        self.outbox = MailOutbox(
+            os.environ.get("MAIL_OUTBOX_PATH", "mail_outbox.db"),
+            self._deliver,
+            max_attempts=int(os.environ.get("MAIL_MAX_ATTEMPTS", "8")),
+            retry_base=float(os.environ.get("MAIL_RETRY_BASE_SECONDS", "30")),
+        )
 
     def send_verification_code(self, recipient, code):
         """Sends a 10-character code for password recovery."""
@@ -22,31 +161,75 @@ class AuthService:
         )
         return self._send_email(recipient, subject, body)
 
-    def send_notification(self, recipient, subject_suffix, content):
-        """Sends a general branded notification (tickets, alerts, etc)."""
+    def _notification(self, subject_suffix, content):
         subject = f"Taremwa Studios - {subject_suffix}"
         body = (
             f"{content}\n\n"
             "If this wasn't you or you have questions about this notification, please contact "
             "taremwastudios@gmail.com. If you did not expect this message, you can safely ignore it."
         )
+        return subject, body
+
+    def send_notification(self, recipient, subject_suffix, content):
+        """Sends a general branded notification (tickets, alerts, etc)."""
+        subject, body = self._notification(subject_suffix, content)
         return self._send_email(recipient, subject, body)
 
+    def queue_notification(self, recipient, subject_suffix, content):
+        """Like send_notification, but only queues it; the outbox worker delivers it with retries."""
+        subject, body = self._notification(subject_suffix, content)
+        return self.outbox.enqueue(recipient, subject, body)
+
     def _send_email(self, recipient, subject, body):
-        if not self.email or not self.password:
-            print("[AuthService] Error: Credentials not set in environment.")
+        try:
+            self._deliver(recipient, subject, body)
+            return True
+        except Exception as e:
+            print(f"[AuthService Error] {e}")
             return False
 
+    def send_many(self, recipients, subject_suffix, content):
+        """Sends the same notification to many recipients over pooled sessions.
+
+        Returns {recipient: True/False}. Meant for mass notifications such as
+        a Campus Pulse announcement; call it from a worker thread, not a request.
+        """
+        subject, body = self._notification(subject_suffix, content)
+        recipients = list(recipients)
+        try:
+            self._check_credentials()
+            results = self.smtp_pool.send_many([self._build_message(r, subject, body) for r in recipients])
+        except Exception as e:
+            print(f"[AuthService Error] {e}")
+            return {r: False for r in recipients}
+        for recipient, result in zip(recipients, results):
+            if result is not True:
+                print(f"[AuthService Error] {recipient}: {result}")
+        return {r: result is True for r, result in zip(recipients, results)}
+
+    def _check_credentials(self):
+        if not self.email or (self.smtp_ssl and not self.password):
+            raise RuntimeError("Credentials not set in environment.")
+
+    def _build_message(self, recipient, subject, body):
         msg = MIMEText(body)
         msg['Subject'] = subject
         msg['From'] = f"Taremwa Studios <{self.email}>"
         msg['To'] = recipient
+        return msg
 
+    def _open_smtp_session(self):
+        smtp_class = smtplib.SMTP_SSL if self.smtp_ssl else smtplib.SMTP
+        server = smtp_class(self.smtp_server, self.smtp_port, timeout=30)
         try:
-            with smtplib.SMTP_SSL(self.smtp_server, self.smtp_port) as server:
+            if self.password:
                 server.login(self.email, self.password)
-                server.send_message(msg)
-            return True
-        except Exception as e:
-            print(f"[AuthService Error] {e}")
-            return False
\ No newline at end of file
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _deliver(self, recipient, subject, body):
+        """Sends one message; raises on any failure (the outbox retries on that)."""
+        self._check_credentials()
+        self.smtp_pool.send(self._build_message(recipient, subject, body))
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""Fan-out-on-write throughput for the push home timeline.
+
+Seeds a throwaway SQLite database with channels of the given sizes, posts
+--posts times into each one through create_post with TIMELINE_STRATEGY=push,
+waits for the fanout queue to drain and prints the create_post rate next to
+the background worker's posts/sec and inbox rows/sec. Use it to pick
+FANOUT_BATCH_SIZE and the FANOUT_MAX_MEMBERS cut-over to pull.
+
+    python benchmarks/bench_fanout.py --members 100 1000 10000 --posts 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.pop("DATABASE_URL", None)
+os.environ["TIMELINE_STRATEGY"] = "push"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    os.environ["FANOUT_BATCH_SIZE"] = str(args.batch_size)
+    os.environ["FANOUT_MAX_MEMBERS"] = str(max(args.members))
+
+    from billboard_logic import BillboardManager
+
+    print(f"{'members':>8} {'create_post/s':>14} {'fanout posts/s':>15} {'rows/s':>10} {'avg lag ms':>11} {'max lag ms':>11}")
+    for members in args.members:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = BillboardManager(os.path.join(tmp, "bench.db"))
+            conn = db.get_connection()
+            cur = conn.cursor()
+            cur.executemany("INSERT INTO users (username, email, badge_type) VALUES (?, ?, 'none')",
+                            [(f"user{i}", f"user{i}@campus.test") for i in range(members)])
+            conn.commit()
+            cur.close()
+            conn.close()
+            channel_id = db.create_channel(1, "bench", "", 0)
+            conn = db.get_connection()
+            cur = conn.cursor()
+            cur.executemany("INSERT INTO channel_memberships (user_id, channel_id) VALUES (?, ?)",
+                            [(user_id, channel_id) for user_id in range(2, members + 1)])
+            cur.execute("UPDATE channels SET member_count = ? WHERE id = ?", (members, channel_id))
+            conn.commit()
+            cur.close()
+            conn.close()
+            db.channels.invalidate()
+
+            started = time.perf_counter()
+            for i in range(args.posts):
+                db.create_post(1, f"post {i}", "text", channel_id=channel_id)
+            posting = time.perf_counter() - started
+            db.fanout.drain()
+            stats = db.get_fanout_stats()
+            db.fanout.close()
+            db.thumbnails.shutdown()
+            db.passwords.shutdown()
+        print(f"{members:>8} {args.posts / posting:>14.1f} {stats['posts_per_sec']:>15.1f} {stats['rows_per_sec']:>10.0f} "
+              f"{stats['avg_lag_ms']:>11.1f} {stats['max_lag_ms']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Password-hash cost vs. login throughput for passwords.PasswordHasher.
+
+For each scrypt cost (n = 2**ln) this times verify() on one thread, which
+is logins/sec per core, and then on --threads threads to show how far the
+KDF pool scales. Use it to pick PASSWORD_SCRYPT_LN for the production box:
+the highest cost whose total rate still covers peak logins.
+
+    python benchmarks/bench_passwords.py --costs 12 13 14 15 16 --seconds 3
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher
+
+
+def rate(hasher, stored, seconds, threads):
+    stop_at = time.perf_counter() + seconds
+
+    def worker():
+        n = 0
+        while time.perf_counter() < stop_at:
+            hasher.verify("correct horse battery staple", stored)
+            n += 1
+        return n
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        total = sum(pool.map(lambda _: worker(), range(threads)))
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--costs", type=int, nargs="+", default=[12, 13, 14, 15, 16], help="log2 of scrypt n")
+    parser.add_argument("-r", type=int, default=8)
+    parser.add_argument("-p", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"{'ln':>3} {'memory':>8} {'ms/login':>9} {'logins/s/core':>14} {f'logins/s x{args.threads}':>16}")
+    for ln in args.costs:
+        hasher = PasswordHasher(ln=ln, r=args.r, p=args.p, workers=1)
+        stored = hasher.hash("correct horse battery staple")
+        single = rate(hasher, stored, args.seconds, 1)
+        multi = rate(hasher, stored, args.seconds, args.threads)
+        memory = 128 * args.r * (1 << ln) * args.p / (1024 * 1024)
+        print(f"{ln:>3} {memory:>6.0f}MB {1000 / single:>9.1f} {single:>14.1f} {multi:>16.1f}")
+        hasher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
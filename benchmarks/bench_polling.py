@@ -0,0 +1,76 @@
+"""Concurrent /feed + /get-messages polling against a running billboard server.
+
+Start the server with DB_EXECUTION_MODE=inline and again with the default
+threadpool mode, run this script against each, and compare the loop-lag
+numbers it prints (taken from /admin/loop-stats).
+
+/get-messages needs a session, so the script logs in as an existing, verified
+account and every client polls one of that user's conversations.
+
+    python benchmarks/bench_polling.py http://127.0.0.1:8006 --username alice --password secret --clients 50 --seconds 20
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+
+def login(base_url, username, password):
+    req = urllib.request.Request(
+        base_url + "/login",
+        data=json.dumps({"username": username, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(req, timeout=30) as res:
+        data = json.loads(res.read())
+    return data["token"], data["user"]["id"]
+
+
+def poll(base_url, token, user_id, peer_id, stop_at, latencies, errors):
+    paths = [f"/feed?limit=100&after_id=0", f"/get-messages/{user_id}/{peer_id}"]
+    headers = {"Authorization": f"Bearer {token}"}
+    i = 0
+    while time.time() < stop_at:
+        started = time.perf_counter()
+        try:
+            req = urllib.request.Request(base_url + paths[i % len(paths)], headers=headers)
+            with urllib.request.urlopen(req, timeout=30) as res:
+                res.read()
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            errors.append(1)
+        i += 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("base_url")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=20)
+    args = parser.parse_args()
+
+    token, user_id = login(args.base_url, args.username, args.password)
+    urllib.request.urlopen(args.base_url + "/admin/loop-stats?reset=true").read()
+    latencies, errors = [], []
+    stop_at = time.time() + args.seconds
+    threads = [threading.Thread(target=poll, args=(args.base_url, token, user_id, user_id + n + 1, stop_at, latencies, errors)) for n in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with urllib.request.urlopen(args.base_url + "/admin/loop-stats") as res:
+        stats = json.loads(res.read())
+    latencies.sort()
+    print(f"requests: {len(latencies)}  errors: {len(errors)}  rps: {len(latencies) / args.seconds:.1f}")
+    if latencies:
+        print(f"latency p50: {latencies[len(latencies) // 2] * 1000:.1f} ms  p99: {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    print("loop:", json.dumps(stats["loop"]))
+    print("db_executor:", json.dumps(stats["db_executor"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Checks the guarantees documented on write_behind.WriteBehindBuffer.
+
+Runs against a throwaway SQLite database with concurrent submitters and
+exits non-zero if any of these fail:
+
+  1. durability: when a future resolves, its row is already visible to a
+     separate connection, so the commit has happened
+  2. bounded staleness: max_wait_ms <= WRITE_BEHIND_DELAY_MS plus one flush,
+     plus the flush in progress if one ran longer than the delay, plus
+     --slack-ms of thread scheduling
+  3. isolation: a write that raises fails only its own future; the rest of
+     its batch commits
+
+    python benchmarks/check_write_behind.py --writes 2000 --threads 16 --delay-ms 10
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.pop("DATABASE_URL", None)
+
+from billboard_logic import BillboardManager
+from write_behind import WriteBehindBuffer
+
+
+def new_buffer(db, args):
+    return WriteBehindBuffer(db.get_connection, max_batch=args.batch, max_delay=args.delay_ms / 1000, begin_sql="BEGIN IMMEDIATE")
+
+
+def submit_concurrently(buffer, args, fn, make_args):
+    """--threads submitters, each pacing its writes randomly, so batches fill partially and fully."""
+    def worker(n):
+        futures = []
+        for i in range(n, args.writes, args.threads):
+            futures.append((i, buffer.submit(fn, *make_args(i))))
+            time.sleep(random.random() * args.pace_ms / 1000)
+        return futures
+    with ThreadPoolExecutor(args.threads) as pool:
+        return [f for chunk in pool.map(worker, range(args.threads)) for f in chunk]
+
+
+def check_durable(db, db_path, args):
+    buffer = new_buffer(db, args)
+    observer = sqlite3.connect(db_path, check_same_thread=False)
+    lock = threading.Lock()
+    not_visible = []
+
+    def on_done(future):
+        # Runs the moment the future resolves; another connection only sees committed rows
+        message_id = future.result()
+        with lock:
+            if observer.execute("SELECT 1 FROM messages WHERE id = ?", (message_id,)).fetchone() is None:
+                not_visible.append(message_id)
+
+    futures = submit_concurrently(buffer, args, db._insert_message, lambda i: (1, 2, f"m{i}"))
+    for _, future in futures:
+        future.add_done_callback(on_done)
+    ids = [future.result() for _, future in futures]
+    buffer.close()
+    observer.close()
+    assert len(set(ids)) == len(ids), "duplicate ids handed out"
+    assert not not_visible, f"{len(not_visible)} futures resolved before their row was committed"
+    return f"{len(ids)} ids, all visible to another connection when their future resolved"
+
+
+def check_staleness(db, args):
+    buffer = new_buffer(db, args)
+    futures = submit_concurrently(buffer, args, db._insert_report, lambda i: (i, 1))
+    for _, future in futures:
+        future.result()
+    buffer.close()
+    stats = buffer.stats()
+    bound = max(args.delay_ms, stats["max_flush_ms"]) + stats["max_flush_ms"] + args.slack_ms
+    assert stats["max_wait_ms"] <= bound, f"max_wait_ms {stats['max_wait_ms']} exceeds {bound:.3f} ({stats})"
+    return (f"{stats['writes']} writes in {stats['flushes']} commits (avg batch {stats['avg_batch']}), "
+            f"max_wait {stats['max_wait_ms']} ms <= {bound:.3f} ms (max flush {stats['max_flush_ms']} ms)")
+
+
+def check_isolation(db, args):
+    buffer = new_buffer(db, args)
+
+    def write(cur, i):
+        if i % 7 == 0:
+            cur.execute("INSERT INTO no_such_table VALUES (1)")
+        return db._insert_message(cur, 3, 4, f"iso{i}")
+
+    futures = submit_concurrently(buffer, args, write, lambda i: (i,))
+    failed, ok = [], []
+    for i, future in futures:
+        try:
+            ok.append((i, future.result()))
+        except sqlite3.OperationalError:
+            failed.append(i)
+    buffer.close()
+    assert sorted(failed) == [i for i in range(args.writes) if i % 7 == 0], "a good write failed, or a bad one succeeded"
+    conn = db.get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT content FROM messages WHERE sender_id = 3")
+    stored = {r[0] for r in cur.fetchall()}
+    cur.close()
+    conn.close()
+    assert stored == {f"iso{i}" for i, _ in ok}, "committed rows do not match the successful futures"
+    return f"{len(failed)} failing writes failed alone; {len(ok)} others committed in {buffer.stats()['flushes']} commits"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--delay-ms", type=float, default=float(os.environ.get("WRITE_BEHIND_DELAY_MS", "10")))
+    parser.add_argument("--pace-ms", type=float, default=2.0, help="max random pause between one thread's writes")
+    # The flusher has to win the GIL back from the submitters after its timed wait.
+    # On a single busy core that, or a GC pause, occasionally adds 10-20 ms
+    parser.add_argument("--slack-ms", type=float, default=25.0, help="allowance for thread wake-up latency")
+    args = parser.parse_args()
+
+    random.seed(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "check.db")
+        db = BillboardManager(db_path)
+        failures = 0
+        for name, check in [
+            ("durability", lambda: check_durable(db, db_path, args)),
+            ("staleness", lambda: check_staleness(db, args)),
+            ("isolation", lambda: check_isolation(db, args)),
+        ]:
+            try:
+                print(f"[ok]   {name}: {check()}")
+            except AssertionError as e:
+                failures += 1
+                print(f"[FAIL] {name}: {e}")
+        db.fanout.close()
+        db.thumbnails.shutdown()
+        db.passwords.shutdown()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,35 +4,212 @@ import psycopg2.extras
 import datetime
 import secrets
 import json
-import hashlib
 import random
 import os
+import base64
+import heapq
+import threading
 from auth_service import AuthService
+from db_pool import ConnectionPool
+from feed_cache import HotFeed, HotFeedSet, InFlightIds
+from live_stats import LiveStats, PresenceTracker
+from media_store import MediaStore
+from thumbnails import ThumbnailPipeline
+from passwords import PasswordHasher
+from sessions import SessionCache, AttemptLimiter, new_token, hash_token, public_user
+from user_cache import UserCache
+from channel_directory import ChannelDirectory
+from fanout import FanoutQueue
+from write_behind import WriteBehindBuffer
+import time
+
+MAX_PAGE_SIZE = 200
+PREVIEW_LENGTH = 140
+
+# WHERE clauses for the post timelines; each one lines up with a partial index below
+FEED_FILTERS = {
+    "wall": "p.is_deleted = 0 AND p.post_type != 'news' AND p.channel_id IS NULL",
+    "news": "p.is_deleted = 0 AND p.post_type = 'news'",
+}
+
+# Secondary indexes managed by init_db: name -> (table, columns, partial WHERE or None).
+# Created with IF NOT EXISTS so they are applied to existing databases on startup.
+# Bump the name when changing a definition so the new shape gets built.
+SCHEMA_INDEXES = {
+    # get_feed: live wall posts, newest first / id > after_id
+    "idx_posts_wall": ("posts", "id", "is_deleted = 0 AND channel_id IS NULL AND post_type != 'news'"),
+    # get_news: live Campus Pulse posts
+    "idx_posts_news": ("posts", "id", "is_deleted = 0 AND post_type = 'news'"),
+    # channel (Node) timelines
+    "idx_posts_channel": ("posts", "channel_id, is_deleted, id", "channel_id IS NOT NULL"),
+    # get_messages: one id range per direction of a conversation, plus the sender side of get_chats
+    "idx_messages_pair_id": ("messages", "sender_id, receiver_id, id", None),
+    # receiver side of get_chats
+    "idx_messages_receiver_id": ("messages", "receiver_id, sender_id, id", None),
+    # members of a channel (the primary key only covers user_id -> channels)
+    "idx_memberships_channel": ("channel_memberships", "channel_id, user_id", None),
+    # media garbage sweep: released content-addressed files
+    "idx_media_refs_released": ("media_refs", "released_at", "refcount <= 0"),
+    # get_chats: a user's conversations, most recent first
+    "idx_conversations_recent": ("conversations", "user_id, last_message_id", None),
+    # expired-session cleanup at login
+    "idx_sessions_user": ("sessions", "user_id, expires_at", None),
+}
+
+# Superseded definitions, dropped by init_db if an older deployment created them
+RETIRED_INDEXES = ["idx_messages_pair", "idx_messages_receiver"]
+
+def timeline_for(post_type, channel_id):
+    """Which FEED_FILTERS timeline a new post lands in, or None for channel-only posts."""
+    if post_type == 'news':
+        return "news"
+    if channel_id is None:
+        return "wall"
+    return None
+
+def unread_category_for(post_type, channel_id):
+    """feed_counters / last_read_markers category a new post counts towards."""
+    if post_type == 'news':
+        return "pulse"
+    if channel_id is None:
+        return "wall"
+    return f"node:{channel_id}"
+
+def encode_cursor(direction, post_id):
+    """Opaque pagination cursor: urlsafe base64 of "<after|before>:<post id>"."""
+    raw = f"{direction}:{int(post_id)}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        direction, post_id = raw.split(":")
+        post_id = int(post_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if direction not in ("after", "before") or post_id < 0:
+        raise ValueError("Invalid cursor")
+    return direction, post_id
 
 class BillboardManager:
     def __init__(self, db_path):
         self.db_path = db_path
         self.database_url = os.environ.get("DATABASE_URL")
         self.auth_service = AuthService()
+        self.passwords = PasswordHasher(
+            ln=int(os.environ.get("PASSWORD_SCRYPT_LN", "14")),
+            r=int(os.environ.get("PASSWORD_SCRYPT_R", "8")),
+            p=int(os.environ.get("PASSWORD_SCRYPT_P", "1")),
+            workers=int(os.environ.get("PASSWORD_HASH_WORKERS", "0")) or None,
+        )
+        self.listeners = []
+        self.media_store = MediaStore(os.environ.get("UPLOAD_DIR", "uploads"))
+        self.media_gc_grace = float(os.environ.get("MEDIA_GC_GRACE_SECONDS", "600"))
+        self._media_gc_lock = threading.Lock()
+        self.thumbnails = ThumbnailPipeline(
+            self.media_store,
+            workers=int(os.environ.get("THUMBNAIL_WORKERS", "2")),
+            cache_size=int(os.environ.get("THUMBNAIL_CACHE_SIZE", "10000")),
+        )
+        self.presence = PresenceTracker(ttl=float(os.environ.get("PRESENCE_TTL", "60")))
+        self.sessions = SessionCache(
+            capacity=int(os.environ.get("SESSION_CACHE_SIZE", "10000")),
+            ttl=float(os.environ.get("SESSION_CACHE_TTL", "300")),
+        )
+        self.users = UserCache(
+            capacity=int(os.environ.get("USER_CACHE_SIZE", "5000")),
+            ttl=float(os.environ.get("USER_CACHE_TTL", "60")),
+        )
+        self.channels = ChannelDirectory(self._load_channels, ttl=float(os.environ.get("CHANNEL_CACHE_TTL", "60")))
+        self.session_lifetime = float(os.environ.get("SESSION_LIFETIME_DAYS", "30")) * 86400
+        self.verify_attempts = AttemptLimiter(
+            max_attempts=int(os.environ.get("VERIFY_MAX_ATTEMPTS", "5")),
+            window=float(os.environ.get("VERIFY_ATTEMPT_WINDOW", "900")),
+        )
+        self.live_stats = LiveStats(self.count_totals, resync_interval=float(os.environ.get("STATS_RESYNC_SECONDS", "300")))
+        self.pool = ConnectionPool(
+            self._connect,
+            min_size=int(os.environ.get("DB_POOL_MIN_SIZE", "1")),
+            max_size=int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+            timeout=float(os.environ.get("DB_POOL_TIMEOUT", "30")),
+            health_check_interval=float(os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL", "5")),
+            max_idle_time=float(os.environ.get("DB_POOL_MAX_IDLE_TIME", "300")),
+            name="postgres" if self.database_url else "sqlite",
+        )
+        # Opt-in group commit for create_post / send_message / report_post; see write_behind.py
+        self.write_behind = WriteBehindBuffer(
+            self.get_connection,
+            max_batch=int(os.environ.get("WRITE_BEHIND_BATCH", "200")),
+            max_delay=float(os.environ.get("WRITE_BEHIND_DELAY_MS", "10")) / 1000,
+            begin_sql=None if self.database_url else "BEGIN IMMEDIATE",
+        ) if os.environ.get("WRITE_BEHIND", "0") == "1" else None
         self.init_db()
+        hot_size = int(os.environ.get("HOT_FEED_SIZE", "200"))
+        self.hot_feeds = {kind: HotFeed(hot_size) for kind in FEED_FILTERS}
+        self.posts_in_flight = InFlightIds()
+        self.warm_hot_feeds()
+        # Home timeline: "pull" merges channel timelines at read time, "push" writes per-member inboxes
+        self.timeline_strategy = os.environ.get("TIMELINE_STRATEGY", "pull")
+        if self.timeline_strategy not in ("pull", "push"):
+            raise ValueError(f"TIMELINE_STRATEGY must be 'pull' or 'push', not {self.timeline_strategy!r}")
+        self.inbox_backfill = int(os.environ.get("TIMELINE_INBOX_BACKFILL", "200"))
+        # Channels with more members than this are never fanned out; readers pull them instead
+        self.fanout_max_members = int(os.environ.get("FANOUT_MAX_MEMBERS", "5000"))
+        self.fanout = FanoutQueue(
+            self.get_channel_member_ids,
+            self._write_inbox_rows,
+            batch_size=int(os.environ.get("FANOUT_BATCH_SIZE", "500")),
+            done=self._finish_fanout_jobs,
+            retries=int(os.environ.get("FANOUT_RETRIES", "5")),
+        )
+        self.sync_timeline_inboxes()
+        self.channel_feeds = HotFeedSet(
+            lambda channel_id, limit: self._get_channel_posts_page(channel_id, limit),
+            capacity=int(os.environ.get("CHANNEL_HOT_FEED_SIZE", "50")),
+            max_feeds=int(os.environ.get("CHANNEL_HOT_FEEDS", "256")),
+        )
+
+    def _connect(self):
+        if self.database_url:
+            # Use PostgreSQL if URL is provided (Production)
+            return psycopg2.connect(self.database_url)
+        # Use SQLite (Local Development). Pooled connections move between threads.
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
 
     def get_connection(self):
+        """Checks a connection out of the pool; conn.close() returns it."""
         try:
-            if self.database_url:
-                # Use PostgreSQL if URL is provided (Production)
-                conn = psycopg2.connect(self.database_url)
-                return conn
-            else:
-                # Use SQLite (Local Development)
-                conn = sqlite3.connect(self.db_path)
-                conn.row_factory = sqlite3.Row
-                return conn
+            return self.pool.acquire()
         except Exception as e:
             print(f"[Database] Connection Error: {e}")
             return None
 
+    def get_pool_stats(self):
+        return self.pool.stats()
+
+    # --- CHANGE EVENTS ---
+    # Listeners are called as fn(event, data, user_ids) after a write commits;
+    # user_ids=None means the event is for everyone. user_ids may also be a
+    # callable that picks the recipients out of a listener's candidate ids,
+    # so a listener that knows who is connected never loads a whole audience.
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def emit(self, event, data, user_ids=None):
+        for fn in self.listeners:
+            try:
+                fn(event, data, user_ids)
+            except Exception as e:
+                print(f"[Events] Listener error on {event}: {e}")
+
     def hash_password(self, password):
-        return hashlib.sha256(password.encode()).hexdigest()
+        return self.passwords.hash(password)
+
+    def ddl(self, sql):
+        # SQLite has no SERIAL; only INTEGER PRIMARY KEY aliases the auto-assigned rowid
+        return sql if self.database_url else sql.replace("SERIAL PRIMARY KEY", "INTEGER PRIMARY KEY")
 
     def init_db(self):
         conn = self.get_connection()
@@ -77,6 +254,7 @@ class BillboardManager:
             description TEXT,
             access_price INTEGER,
             channel_type TEXT DEFAULT 'private',
+            member_count INTEGER DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )'''
 
@@ -91,61 +269,206 @@ class BillboardManager:
             user_id INTEGER,
             category TEXT,
             last_post_id INTEGER,
+            last_seq INTEGER DEFAULT 0,
             PRIMARY KEY(user_id, category)
         )'''
+
+        # Monotonic per-category post counters; unread = counter seq - marker last_seq
+        counters_sql = '''CREATE TABLE IF NOT EXISTS feed_counters (
+            category TEXT PRIMARY KEY,
+            seq INTEGER DEFAULT 0,
+            last_post_id INTEGER DEFAULT 0
+        )'''
         
         messages_sql = "CREATE TABLE IF NOT EXISTS messages (id SERIAL PRIMARY KEY, sender_id INTEGER, receiver_id INTEGER, content TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
 
-        cur.execute(users_sql)
-        cur.execute(posts_sql)
-        cur.execute(channels_sql)
-        cur.execute(memberships_sql)
-        cur.execute(markers_sql)
-        cur.execute(messages_sql) # Moved here
+        cur.execute(self.ddl(users_sql))
+        cur.execute(self.ddl(posts_sql))
+        cur.execute(self.ddl(channels_sql))
+        cur.execute(self.ddl(memberships_sql))
+        self.ensure_column(cur, "channels", "member_count", "INTEGER DEFAULT 0")
+        # 1 once the member's timeline_inbox holds the channel's recent posts (push timelines)
+        self.ensure_column(cur, "channel_memberships", "inbox_backfilled", "INTEGER DEFAULT 0")
+        # Every channel has its owner as a member, so 0 means "not counted yet"
+        cur.execute('''
+            UPDATE channels SET member_count = (SELECT COUNT(*) FROM channel_memberships m WHERE m.channel_id = channels.id)
+            WHERE member_count IS NULL OR member_count = 0
+        ''')
+        cur.execute(self.ddl(markers_sql))
+        self.ensure_column(cur, "last_read_markers", "last_seq", "INTEGER DEFAULT 0")
+        cur.execute(self.ddl(counters_sql))
+        cur.execute(self.ddl(messages_sql)) # Moved here
+
+        # One row per participant of each DM pair, maintained by send_message
+        conversations_sql = '''CREATE TABLE IF NOT EXISTS conversations (
+            user_id INTEGER,
+            peer_id INTEGER,
+            last_message_id INTEGER,
+            last_sender_id INTEGER,
+            last_preview TEXT,
+            last_at TIMESTAMP,
+            unread_count INTEGER DEFAULT 0,
+            PRIMARY KEY(user_id, peer_id)
+        )'''
+        cur.execute(self.ddl(conversations_sql))
+        self.backfill_conversations(cur)
+        self.backfill_feed_counters(cur)
+
+        # Reference counts for content-addressed media (posts.media_url / users.avatar_url)
+        media_refs_sql = '''CREATE TABLE IF NOT EXISTS media_refs (
+            media_url TEXT PRIMARY KEY,
+            refcount INTEGER DEFAULT 0,
+            released_at DOUBLE PRECISION
+        )'''
+        cur.execute(self.ddl(media_refs_sql))
+
+        # Fan-out-on-write inboxes for the home timeline (TIMELINE_STRATEGY=push)
+        inbox_sql = '''CREATE TABLE IF NOT EXISTS timeline_inbox (
+            user_id INTEGER,
+            post_id INTEGER,
+            PRIMARY KEY(user_id, post_id)
+        )'''
+        cur.execute(self.ddl(inbox_sql))
+        # Posts whose fan-out has not finished yet; written with the post, removed by the fanout worker
+        fanout_jobs_sql = '''CREATE TABLE IF NOT EXISTS fanout_jobs (
+            post_id INTEGER PRIMARY KEY,
+            channel_id INTEGER
+        )'''
+        cur.execute(self.ddl(fanout_jobs_sql))
+
+        # Login sessions; only a hash of each token is stored
+        sessions_sql = '''CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY,
+            user_id INTEGER,
+            created_at DOUBLE PRECISION,
+            expires_at DOUBLE PRECISION
+        )'''
+        cur.execute(self.ddl(sessions_sql))
+
+        # Moderation reports; created here rather than on first report so batched inserts carry no DDL
+        reports_sql = "CREATE TABLE IF NOT EXISTS reports (id SERIAL PRIMARY KEY, post_id INTEGER, user_id INTEGER, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        cur.execute(self.ddl(reports_sql))
+
+        created = self.ensure_indexes(cur)
+        if created:
+            print(f"[Database] Created indexes: {', '.join(created)}")
         
         conn.commit()
         cur.close()
         conn.close()
 
-    def get_user_by_username(self, username):
+    def ensure_column(self, cur, table, column, decl):
+        """Adds a column to an existing table if an older schema lacks it."""
+        if self.database_url:
+            cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = %s", (table,))
+        else:
+            cur.execute(f"PRAGMA table_info({table})")
+        names = {r[0] if self.database_url else r[1] for r in cur.fetchall()}
+        if column not in names:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    def backfill_feed_counters(self, cur):
+        """Seeds feed_counters from existing posts once, for databases that predate the table."""
+        cur.execute("SELECT 1 FROM feed_counters LIMIT 1")
+        if cur.fetchone():
+            return
+        cur.execute('''
+            INSERT INTO feed_counters (category, seq, last_post_id)
+            SELECT category, COUNT(*), MAX(id) FROM (
+                SELECT id, CASE
+                    WHEN post_type = 'news' THEN 'pulse'
+                    WHEN channel_id IS NULL THEN 'wall'
+                    ELSE 'node:' || channel_id
+                END AS category
+                FROM posts
+            ) p GROUP BY category
+        ''')
+
+    def backfill_conversations(self, cur):
+        """Builds conversations from message history once, for databases that predate the table."""
+        cur.execute("SELECT 1 FROM conversations LIMIT 1")
+        if cur.fetchone():
+            return
+        cur.execute("SELECT 1 FROM messages LIMIT 1")
+        if not cur.fetchone():
+            return
+        cur.execute(f'''
+            INSERT INTO conversations (user_id, peer_id, last_message_id, last_sender_id, last_preview, last_at, unread_count)
+            SELECT l.user_id, l.peer_id, m.id, m.sender_id, SUBSTR(m.content, 1, {PREVIEW_LENGTH}), m.created_at, 0
+            FROM (
+                SELECT user_id, peer_id, MAX(id) AS last_id FROM (
+                    SELECT sender_id AS user_id, receiver_id AS peer_id, id FROM messages
+                    UNION ALL
+                    SELECT receiver_id AS user_id, sender_id AS peer_id, id FROM messages WHERE receiver_id != sender_id
+                ) sides GROUP BY user_id, peer_id
+            ) l
+            JOIN messages m ON m.id = l.last_id
+        ''')
+        print("[Database] Backfilled conversations from message history")
+
+    def get_existing_indexes(self, cur):
+        if self.database_url:
+            cur.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")
+        else:
+            cur.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        return {r[0] for r in cur.fetchall()}
+
+    def ensure_indexes(self, cur):
+        """Creates any missing SCHEMA_INDEXES and refreshes planner stats for touched tables."""
+        existing = self.get_existing_indexes(cur)
+        for name in RETIRED_INDEXES:
+            if name in existing:
+                cur.execute(f"DROP INDEX IF EXISTS {name}")
+        created = []
+        for name, (table, columns, where) in SCHEMA_INDEXES.items():
+            if name in existing:
+                continue
+            sql = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+            if where:
+                sql += f" WHERE {where}"
+            cur.execute(sql)
+            created.append(name)
+        for table in sorted({SCHEMA_INDEXES[name][0] for name in created}):
+            cur.execute(f"ANALYZE {table}")
+        return created
+
+    # --- USERS (read-through cache) ---
+    def _get_user(self, key, value):
+        user = self.users.get(key, value)
+        if user is not None:
+            return user
+        mark = self.users.mark()
         conn = self.get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
-        cur.execute("SELECT * FROM users WHERE username = %s" if self.database_url else "SELECT * FROM users WHERE username = ?", (username,))
+        # key is one of the fixed column names below, never user input
+        cur.execute(f"SELECT * FROM users WHERE {key} = %s" if self.database_url else f"SELECT * FROM users WHERE {key} = ?", (value,))
         res = cur.fetchone()
         cur.close()
         conn.close()
-        return dict(res) if res else None
+        if not res:
+            return None
+        user = dict(res)
+        self.users.put(user, mark)
+        return user
+
+    def get_user_by_username(self, username):
+        return self._get_user("username", username)
 
     def get_user_by_id(self, user_id):
-        conn = self.get_connection()
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
-        cur.execute("SELECT * FROM users WHERE id = %s" if self.database_url else "SELECT * FROM users WHERE id = ?", (user_id,))
-        res = cur.fetchone()
-        cur.close()
-        conn.close()
-        return dict(res) if res else None
+        return self._get_user("id", user_id)
 
     def get_user_by_email(self, email):
-        conn = self.get_connection()
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
-        cur.execute("SELECT * FROM users WHERE email = %s" if self.database_url else "SELECT * FROM users WHERE email = ?", (email,))
-        res = cur.fetchone()
-        cur.close()
-        conn.close()
-        return dict(res) if res else None
+        return self._get_user("email", email)
 
-    def get_user_by_email(self, email):
-        conn = self.get_connection()
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
-        cur.execute("SELECT * FROM users WHERE email = %s" if self.database_url else "SELECT * FROM users WHERE email = ?", (email,))
-        res = cur.fetchone()
-        cur.close()
-        conn.close()
-        return dict(res) if res else None
+    def _user_changed(self, user_id):
+        """Drops every cached copy of a user after a committed change to their row."""
+        self.users.invalidate(user_id)
+        self.sessions.invalidate_user(user_id)
 
-    def create_user(self, username, password, email, phone, full_names, home_address):
+    def create_user(self, username, password, email, phone, full_names, home_address, password_hash=None):
+        # Callers on the event loop pass a hash made with passwords.hash_async
         code = str(random.randint(1000000, 9999999))
-        hashed_pw = self.hash_password(password)
+        hashed_pw = password_hash or self.hash_password(password)
         conn = self.get_connection()
         cur = conn.cursor()
         sql = '''
@@ -160,39 +483,142 @@ class BillboardManager:
         conn.commit()
         cur.close()
         conn.close()
-        self.auth_service.send_notification(email, "Verification Code", f"Your verification code is: {code}")
+        self.live_stats.incr("users")
+        self.auth_service.queue_notification(email, "Verification Code", f"Your verification code is: {code}")
         return user_id
 
+    def update_password_hash(self, user_id, old_hash, new_hash):
+        """Swaps in a rehashed password, unless the password changed in the meantime."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        sql = "UPDATE users SET password = %s WHERE id = %s AND password = %s" if self.database_url else "UPDATE users SET password = ? WHERE id = ? AND password = ?"
+        cur.execute(sql, (new_hash, user_id, old_hash))
+        updated = cur.rowcount == 1
+        conn.commit()
+        cur.close()
+        conn.close()
+        self._user_changed(user_id)
+        return updated
+
+    # --- SESSIONS ---
+    # Opaque bearer tokens issued at login. Requests resolve their user from
+    # the SessionCache; the sessions table is only read on a cache miss.
+    def create_session(self, user_id):
+        token = new_token()
+        now = time.time()
+        ph = "%s" if self.database_url else "?"
+        conn = self.get_connection()
+        cur = conn.cursor()
+        cur.execute(f"DELETE FROM sessions WHERE user_id = {ph} AND expires_at <= {ph}", (user_id, now))
+        cur.execute(
+            f"INSERT INTO sessions (token_hash, user_id, created_at, expires_at) VALUES ({ph}, {ph}, {ph}, {ph})",
+            (hash_token(token), user_id, now, now + self.session_lifetime),
+        )
+        conn.commit()
+        cur.close()
+        conn.close()
+        return token
+
+    def get_cached_session_user(self, token):
+        """The session's user if it is in the cache, without touching the database."""
+        return self.sessions.get(hash_token(token)) if token else None
+
+    def get_session_user(self, token):
+        """Resolves a bearer token to its user (private columns removed), or None."""
+        if not token:
+            return None
+        token_hash = hash_token(token)
+        user = self.sessions.get(token_hash)
+        if user is not None:
+            return user
+        mark = self.sessions.mark()
+        conn = self.get_connection()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
+        sql = '''
+            SELECT u.*, s.expires_at AS session_expires_at
+            FROM sessions s
+            JOIN users u ON u.id = s.user_id
+            WHERE s.token_hash = %s AND s.expires_at > %s
+        ''' if self.database_url else '''
+            SELECT u.*, s.expires_at AS session_expires_at
+            FROM sessions s
+            JOIN users u ON u.id = s.user_id
+            WHERE s.token_hash = ? AND s.expires_at > ?
+        '''
+        cur.execute(sql, (token_hash, time.time()))
+        res = cur.fetchone()
+        cur.close()
+        conn.close()
+        if not res:
+            return None
+        row = dict(res)
+        expires_at = row.pop("session_expires_at")
+        user = public_user(row)
+        self.sessions.put(token_hash, user, expires_at, mark)
+        return user
+
+    def revoke_session(self, token):
+        token_hash = hash_token(token)
+        conn = self.get_connection()
+        cur = conn.cursor()
+        cur.execute("DELETE FROM sessions WHERE token_hash = %s" if self.database_url else "DELETE FROM sessions WHERE token_hash = ?", (token_hash,))
+        conn.commit()
+        cur.close()
+        conn.close()
+        self.sessions.discard(token_hash)
+
     def verify_email(self, email, code):
+        """Marks the email verified if the code matches; the code is single-use.
+
+        Raises PermissionError after too many wrong codes for this email.
+        """
+        if self.verify_attempts.is_blocked(email):
+            raise PermissionError("Too many verification attempts. Try again later.")
         conn = self.get_connection()
         cur = conn.cursor()
-        sql = "SELECT id FROM users WHERE email = %s AND verification_code = %s" if self.database_url else "SELECT id FROM users WHERE email = ? AND verification_code = ?"
+        sql = "SELECT id FROM users WHERE email = %s AND verification_code = %s AND is_email_verified = 0" if self.database_url else "SELECT id FROM users WHERE email = ? AND verification_code = ? AND is_email_verified = 0"
         cur.execute(sql, (email, code))
         res = cur.fetchone()
         if res:
-            upd = "UPDATE users SET is_email_verified = 1 WHERE id = %s" if self.database_url else "UPDATE users SET is_email_verified = 1 WHERE id = ?"
-            cur.execute(upd, (res[0],))
+            # Clearing the code means it can't be replayed to mint more sessions
+            upd = "UPDATE users SET is_email_verified = 1, verification_code = NULL WHERE id = %s AND verification_code = %s" if self.database_url else "UPDATE users SET is_email_verified = 1, verification_code = NULL WHERE id = ? AND verification_code = ?"
+            cur.execute(upd, (res[0], code))
+            claimed = cur.rowcount == 1
             conn.commit()
             cur.close()
             conn.close()
-            return True
+            if claimed:
+                self.verify_attempts.reset(email)
+                self._user_changed(res[0])
+                return True
+            return False
         cur.close()
         conn.close()
+        self.verify_attempts.fail(email)
         return False
 
     def is_email_verified(self, user_id):
+        user = self.get_user_by_id(user_id)
+        return user["is_email_verified"] == 1 if user else False
+
+    # With write-behind on, the server does not call create_post / send_message /
+    # report_post on a DB thread, since result() would hold that thread for the
+    # whole batching window and cap a batch at DB_THREADS writes. It calls
+    # queue_*() on the event loop instead, awaits the Future there, and then
+    # runs the *_written() follow-up on a DB thread.
+    def _write(self, fn, *args):
+        """Runs fn(cur, *args) and commits, in its own transaction or the next write-behind batch."""
+        if self.write_behind:
+            return self.write_behind.submit(fn, *args).result()
         conn = self.get_connection()
         cur = conn.cursor()
-        sql = "SELECT is_email_verified FROM users WHERE id = %s" if self.database_url else "SELECT is_email_verified FROM users WHERE id = ?"
-        cur.execute(sql, (user_id,))
-        res = cur.fetchone()
+        result = fn(cur, *args)
+        conn.commit()
         cur.close()
         conn.close()
-        return res[0] == 1 if res else False
+        return result
 
-    def create_post(self, user_id, content, post_type, channel_id=None, media_url=None, media_type=None):
-        conn = self.get_connection()
-        cur = conn.cursor()
+    def _insert_post(self, cur, user_id, content, post_type, channel_id, media_url, media_type, reserved):
         sql = '''
             INSERT INTO posts (user_id, content, post_type, channel_id, media_url, media_type)
             VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
@@ -202,79 +628,189 @@ class BillboardManager:
         '''
         cur.execute(sql, (user_id, content, post_type, channel_id, media_url, media_type))
         post_id = cur.fetchone()[0] if self.database_url else cur.lastrowid
-        conn.commit()
-        cur.close()
-        conn.close()
+        # Before the commit, so no reader can see this id committed but unaccounted for
+        self.posts_in_flight.add(post_id)
+        reserved.append(post_id)
+        self._incref_media(cur, media_url)
+        if self._fans_out(channel_id):
+            cur.execute("INSERT INTO fanout_jobs (post_id, channel_id) VALUES (%s, %s)" if self.database_url else "INSERT INTO fanout_jobs (post_id, channel_id) VALUES (?, ?)", (post_id, channel_id))
+        category = unread_category_for(post_type, channel_id)
+        self._bump_feed_counter(cur, category, post_id)
+        self._skip_own_post(cur, user_id, category, post_id)
         return post_id
 
-    def get_feed(self, limit=100, after_id=0):
+    def create_post(self, user_id, content, post_type, channel_id=None, media_url=None, media_type=None):
+        reserved = []
+        try:
+            post_id = self._write(self._insert_post, user_id, content, post_type, channel_id, media_url, media_type, reserved)
+        except Exception:
+            self._release_post_ids(reserved)
+            raise
+        self.post_written(post_id, post_type, channel_id, media_url, media_type)
+        return post_id
+
+    def queue_post(self, user_id, content, post_type, channel_id=None, media_url=None, media_type=None):
+        """Write-behind only: queues the insert and returns a Future of the post id; see _write."""
+        reserved = []
+        future = self.write_behind.submit(self._insert_post, user_id, content, post_type, channel_id, media_url, media_type, reserved)
+        future.add_done_callback(lambda f: f.exception() and self._release_post_ids(reserved))
+        return future
+
+    def _release_post_ids(self, reserved):
+        # The insert never committed: stop holding feed readers back for its id
+        for reserved_id in reserved:
+            self.posts_in_flight.discard(reserved_id)
+
+    def post_written(self, post_id, post_type, channel_id=None, media_url=None, media_type=None):
+        """Everything create_post does once the insert has committed."""
+        row = None
+        kind = timeline_for(post_type, channel_id)
+        try:
+            row = self.get_post(post_id)
+        finally:
+            # Added in the same step that releases the id, so feed readers never skip it
+            self.posts_in_flight.land(post_id, self.hot_feeds[kind] if kind else self.channel_feeds.peek(channel_id), row)
+        # Best effort from here on: the post is committed and visible
+        if self._fans_out(channel_id):
+            self.fanout.submit(channel_id, post_id)
+        self.live_stats.incr("posts")
+        if media_type == "image":
+            self.thumbnails.submit(media_url, "media")
+        if row and self.listeners:
+            if kind:
+                self.emit(kind if kind == "news" else "post", self.with_media_variants([row])[0])
+            else:
+                self.emit("channel_post", self.with_media_variants([row])[0],
+                          lambda user_ids: self.get_channel_members_among(channel_id, user_ids))
+
+    def get_post(self, post_id):
         conn = self.get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
         sql = '''
             SELECT p.*, u.username, u.badge_type, u.avatar_url as user_avatar 
             FROM posts p 
             JOIN users u ON p.user_id = u.id 
-            WHERE p.is_deleted = 0 AND p.post_type != 'news' AND p.channel_id IS NULL AND p.id > %s
-            ORDER BY p.created_at DESC LIMIT %s
+            WHERE p.id = %s
         ''' if self.database_url else '''
             SELECT p.*, u.username, u.badge_type, u.avatar_url as user_avatar 
             FROM posts p 
             JOIN users u ON p.user_id = u.id 
-            WHERE p.is_deleted = 0 AND p.post_type != 'news' AND p.channel_id IS NULL AND p.id > ?
-            ORDER BY p.created_at DESC LIMIT ?
+            WHERE p.id = ?
         '''
-        cur.execute(sql, (after_id, limit))
-        res = [dict(r) for r in cur.fetchall()]
+        cur.execute(sql, (post_id,))
+        res = cur.fetchone()
         cur.close()
         conn.close()
-        return res
+        return dict(res) if res else None
 
-    def get_news(self, limit=100, after_id=0):
+    # --- FEEDS (keyset pagination) ---
+    # Pages are addressed by post id, never OFFSET, so page 500 is the same
+    # index range scan on idx_posts_wall / idx_posts_news as page 1.
+    def _get_posts_page(self, where, params, limit, after_id=0, before_id=None):
+        ph = "%s" if self.database_url else "?"
+        if before_id:
+            where, params, order = f"{where} AND p.id < {ph}", params + (before_id,), "DESC"
+        elif after_id:
+            # Oldest-first above the cursor so a burst larger than `limit` leaves no gap
+            where, params, order = f"{where} AND p.id > {ph}", params + (after_id,), "ASC"
+        else:
+            order = "DESC"
         conn = self.get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
-        sql = '''
-            SELECT p.*, u.username, u.badge_type, u.avatar_url as user_avatar 
-            FROM posts p 
-            JOIN users u ON p.user_id = u.id 
-            WHERE p.is_deleted = 0 AND p.post_type = 'news' AND p.id > %s
-            ORDER BY p.created_at DESC LIMIT %s
-        ''' if self.database_url else '''
+        sql = f'''
             SELECT p.*, u.username, u.badge_type, u.avatar_url as user_avatar 
             FROM posts p 
             JOIN users u ON p.user_id = u.id 
-            WHERE p.is_deleted = 0 AND p.post_type = 'news' AND p.id > ?
-            ORDER BY p.created_at DESC LIMIT ?
+            WHERE {where}
+            ORDER BY p.id {order} LIMIT {ph}
         '''
-        cur.execute(sql, (after_id, limit))
+        cur.execute(sql, params + (limit,))
         res = [dict(r) for r in cur.fetchall()]
         cur.close()
         conn.close()
+        if order == "ASC":
+            res.reverse()
         return res
 
-    def update_user_profile(self, user_id, bio=None, avatar_url=None):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        if bio:
-            sql = "UPDATE users SET bio = %s WHERE id = %s" if self.database_url else "UPDATE users SET bio = ? WHERE id = ?"
-            cur.execute(sql, (bio, user_id))
-        if avatar_url:
-            sql = "UPDATE users SET avatar_url = %s WHERE id = %s" if self.database_url else "UPDATE users SET avatar_url = ? WHERE id = ?"
-            cur.execute(sql, (avatar_url, user_id))
-        conn.commit()
-        cur.close()
-        conn.close()
-        return True
+    def _paginate(self, fetch, limit, after_id, before_id, cursor):
+        """Wraps a newest-first fetch into {"items", "next_cursor", "has_more"}.
+
+        next_cursor continues in the direction of the request: older posts for
+        first/before pages, newer posts for after pages (i.e. the next poll).
+        """
+        if cursor:
+            direction, post_id = decode_cursor(cursor)
+            after_id, before_id = (post_id, None) if direction == "after" else (0, post_id)
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        items = fetch(limit=limit, after_id=after_id, before_id=before_id)
+        has_more = len(items) == limit
+        if after_id and not before_id:
+            next_cursor = encode_cursor("after", items[0]["id"] if items else after_id)
+        else:
+            next_cursor = encode_cursor("before", items[-1]["id"]) if has_more else None
+        return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+    # --- HOT FEED BUFFERS ---
+    # The heartbeat polls /feed and /news every few seconds and almost always
+    # gets nothing back; those polls are answered from memory.
+    def warm_hot_feeds(self):
+        for kind, feed in self.hot_feeds.items():
+            feed.load(self._get_posts_page(FEED_FILTERS[kind], (), feed.capacity))
+
+    def refresh_hot_feed_author(self, user_id):
+        user = self.get_user_by_id(user_id)
+        if user:
+            fields = {"username": user["username"], "badge_type": user["badge_type"], "user_avatar": user["avatar_url"]}
+            for feed in self.hot_feeds.values():
+                feed.update_author(user_id, fields)
+            self.channel_feeds.update_author(user_id, fields)
+
+    def get_hot_feed_stats(self):
+        return {**{kind: feed.stats() for kind, feed in self.hot_feeds.items()}, "channels": self.channel_feeds.stats()}
+
+    def _get_timeline(self, kind, limit, after_id, before_id):
+        rows = self.posts_in_flight.page(self.hot_feeds[kind], limit, after_id, before_id)
+        if rows is None:
+            rows = self._get_posts_page(FEED_FILTERS[kind], (), limit, after_id, before_id)
+        return self.with_media_variants(rows)
+
+    def with_media_variants(self, rows):
+        """Copies of feed rows with media_variants / avatar_variants ({width: url}) added.
+
+        Copies, because the rows may be shared with a HotFeed. A variant only
+        appears once it has been rendered; clients fall back to media_url.
+        """
+        return [
+            dict(
+                r,
+                media_variants=self.thumbnails.variants(r.get("media_url"), "media") if r.get("media_type") == "image" else {},
+                avatar_variants=self.thumbnails.variants(r.get("user_avatar"), "avatar"),
+            )
+            for r in rows
+        ]
+
+    def get_feed(self, limit=100, after_id=0, before_id=None):
+        return self._get_timeline("wall", limit, after_id, before_id)
+
+    def get_news(self, limit=100, after_id=0, before_id=None):
+        return self._get_timeline("news", limit, after_id, before_id)
+
+    def get_feed_page(self, limit=100, after_id=0, before_id=None, cursor=None):
+        return self._paginate(self.get_feed, limit, after_id, before_id, cursor)
+
+    def get_news_page(self, limit=100, after_id=0, before_id=None, cursor=None):
+        return self._paginate(self.get_news, limit, after_id, before_id, cursor)
 
     # --- CHANNELS & NODES ---
     def create_channel(self, owner_id, name, description, price, channel_type='private'):
         conn = self.get_connection()
         cur = conn.cursor()
         sql = '''
-            INSERT INTO channels (owner_id, name, description, access_price, channel_type)
-            VALUES (%s, %s, %s, %s, %s) RETURNING id
+            INSERT INTO channels (owner_id, name, description, access_price, channel_type, member_count)
+            VALUES (%s, %s, %s, %s, %s, 1) RETURNING id
         ''' if self.database_url else '''
-            INSERT INTO channels (owner_id, name, description, access_price, channel_type)
-            VALUES (?, ?, ?, ?, ?)
+            INSERT INTO channels (owner_id, name, description, access_price, channel_type, member_count)
+            VALUES (?, ?, ?, ?, ?, 1)
         '''
         cur.execute(sql, (owner_id, name, description, price, channel_type))
         channel_id = cur.fetchone()[0] if self.database_url else cur.lastrowid
@@ -286,68 +822,198 @@ class BillboardManager:
         conn.commit()
         cur.close()
         conn.close()
+        self.live_stats.incr("channels")
+        self.channels.invalidate()
         return channel_id
 
-    def get_channels(self):
+    def _load_channels(self):
         conn = self.get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
-        cur.execute("SELECT * FROM channels ORDER BY created_at DESC")
+        cur.execute("SELECT * FROM channels ORDER BY created_at DESC, id DESC")
         res = [dict(r) for r in cur.fetchall()]
         cur.close()
         conn.close()
         return res
 
+    def get_channels(self):
+        return self.channels.all()
+
+    def get_channel(self, channel_id):
+        channel = self.channels.lookup(channel_id)
+        if channel is not None:
+            return channel
+        # Not in the snapshot: possibly created by another process since the last load
+        conn = self.get_connection()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
+        cur.execute("SELECT * FROM channels WHERE id = %s" if self.database_url else "SELECT * FROM channels WHERE id = ?", (channel_id,))
+        res = cur.fetchone()
+        cur.close()
+        conn.close()
+        return dict(res) if res else None
+
+    def get_owned_channels(self, owner_id):
+        return self.channels.owned_by(owner_id)
+
+    # --- CHANNEL FEEDS ---
+    # Same keyset pagination as the wall, on idx_posts_channel (channel_id, is_deleted, id),
+    # with the newest posts of recently read channels held in channel_feeds.
+    def _get_channel_posts_page(self, channel_id, limit, after_id=0, before_id=None):
+        ph = "%s" if self.database_url else "?"
+        return self._get_posts_page(f"p.channel_id = {ph} AND p.is_deleted = 0", (channel_id,), limit, after_id, before_id)
+
+    def _get_channel_posts(self, channel_id, limit, after_id=0, before_id=None):
+        rows = self.posts_in_flight.page(self.channel_feeds.get(channel_id), limit, after_id, before_id)
+        if rows is None:
+            rows = self._get_channel_posts_page(channel_id, limit, after_id, before_id)
+        return self.with_media_variants(rows)
+
+    def get_channel_feed(self, channel_id, user_id, cursor=None, limit=50, after_id=0, before_id=None):
+        """A member's page of a channel timeline, or None if the channel does not exist.
+
+        Raises PermissionError for non-members and ValueError for a bad cursor.
+        """
+        if not self.get_channel(channel_id):
+            return None
+        if not self.is_channel_member(user_id, channel_id):
+            raise PermissionError("Join this Node to see its transmissions.")
+        fetch = lambda limit, after_id, before_id: self._get_channel_posts(channel_id, limit, after_id, before_id)
+        return self._paginate(fetch, limit, after_id, before_id, cursor)
+
     # --- CHATS & MESSAGING ---
+    def _insert_message(self, cur, sender_id, receiver_id, content):
+        sql = "INSERT INTO messages (sender_id, receiver_id, content) VALUES (%s, %s, %s) RETURNING id" if self.database_url else "INSERT INTO messages (sender_id, receiver_id, content) VALUES (?, ?, ?)"
+        cur.execute(sql, (sender_id, receiver_id, content))
+        message_id = cur.fetchone()[0] if self.database_url else cur.lastrowid
+        self._touch_conversation(cur, sender_id, receiver_id, sender_id, message_id, content, 0)
+        if receiver_id != sender_id:
+            self._touch_conversation(cur, receiver_id, sender_id, sender_id, message_id, content, 1)
+        return message_id
+
     def send_message(self, sender_id, receiver_id, content):
+        message_id = self._write(self._insert_message, sender_id, receiver_id, content)
+        self.message_written(message_id, sender_id, receiver_id)
+        return message_id
+
+    def queue_message(self, sender_id, receiver_id, content):
+        """Write-behind only: queues the insert and returns a Future of the message id; see _write."""
+        return self.write_behind.submit(self._insert_message, sender_id, receiver_id, content)
+
+    def message_written(self, message_id, sender_id, receiver_id):
+        if self.listeners:
+            message = self.get_message(message_id)
+            if message:
+                self.emit("message", message, [sender_id, receiver_id])
+                self.emit("unreads", {"category": "chats"}, [receiver_id])
+
+    def get_message(self, message_id):
         conn = self.get_connection()
-        cur = conn.cursor()
-        
-        sql = "INSERT INTO messages (sender_id, receiver_id, content) VALUES (%s, %s, %s)" if self.database_url else "INSERT INTO messages (sender_id, receiver_id, content) VALUES (?, ?, ?)"
-        cur.execute(sql, (sender_id, receiver_id, content))
-        conn.commit()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
+        cur.execute("SELECT * FROM messages WHERE id = %s" if self.database_url else "SELECT * FROM messages WHERE id = ?", (message_id,))
+        res = cur.fetchone()
         cur.close()
         conn.close()
-        return True
+        return dict(res) if res else None
+
+    def get_messages(self, user1, user2, after_id=0, before_id=None, limit=100):
+        """One page of a conversation, oldest first.
+
+        after_id returns messages newer than the cursor (the poll/sync path);
+        before_id returns the page just older than it (history scrolling);
+        neither returns the latest page. Each direction of the conversation is
+        read as its own range on idx_messages_pair_id and capped at `limit`,
+        so the cost doesn't depend on how long the conversation is.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        ph = "%s" if self.database_url else "?"
+        if after_id and not before_id:
+            bound, order = f"id > {ph}", "ASC"
+            bound_arg = after_id
+        elif before_id:
+            bound, order = f"id < {ph}", "DESC"
+            bound_arg = before_id
+        else:
+            bound, order = None, "DESC"
+        half = f"SELECT * FROM messages WHERE sender_id = {ph} AND receiver_id = {ph}"
+        if bound:
+            half += f" AND {bound}"
+        half += f" ORDER BY id {order} LIMIT {ph}"
+
+        def half_args(a, b):
+            return (a, b) + ((bound_arg,) if bound else ()) + (limit,)
+
+        if user1 == user2:
+            sql, args = half, half_args(user1, user2)
+        else:
+            sql = f"SELECT * FROM ({half}) a UNION ALL SELECT * FROM ({half}) b ORDER BY id {order} LIMIT {ph}"
+            args = half_args(user1, user2) + half_args(user2, user1) + (limit,)
 
-    def get_messages(self, user1, user2):
         conn = self.get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
-        sql = '''
-            SELECT * FROM messages 
-            WHERE (sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s)
-            ORDER BY created_at ASC
-        ''' if self.database_url else '''
-            SELECT * FROM messages 
-            WHERE (sender_id = ? AND receiver_id = ?) OR (sender_id = ? AND receiver_id = ?)
-            ORDER BY created_at ASC
-        '''
-        cur.execute(sql, (user1, user2, user2, user1))
+        cur.execute(sql, args)
         res = [dict(r) for r in cur.fetchall()]
         cur.close()
         conn.close()
+        if order == "DESC":
+            res.reverse()
         return res
 
+    def _touch_conversation(self, cur, user_id, peer_id, sender_id, message_id, content, unread_delta):
+        sql = '''
+            INSERT INTO conversations (user_id, peer_id, last_message_id, last_sender_id, last_preview, last_at, unread_count)
+            VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s)
+            ON CONFLICT (user_id, peer_id) DO UPDATE SET
+                last_message_id = excluded.last_message_id,
+                last_sender_id = excluded.last_sender_id,
+                last_preview = excluded.last_preview,
+                last_at = excluded.last_at,
+                unread_count = conversations.unread_count + excluded.unread_count
+        ''' if self.database_url else '''
+            INSERT INTO conversations (user_id, peer_id, last_message_id, last_sender_id, last_preview, last_at, unread_count)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
+            ON CONFLICT (user_id, peer_id) DO UPDATE SET
+                last_message_id = excluded.last_message_id,
+                last_sender_id = excluded.last_sender_id,
+                last_preview = excluded.last_preview,
+                last_at = excluded.last_at,
+                unread_count = conversations.unread_count + excluded.unread_count
+        '''
+        cur.execute(sql, (user_id, peer_id, message_id, sender_id, content[:PREVIEW_LENGTH], unread_delta))
+
     def get_chats(self, user_id):
         conn = self.get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
-        # Find all users this person has messaged
+        # Everyone this person has messaged, most recent conversation first
         sql = '''
-            SELECT DISTINCT u.id, u.username, u.badge_type, u.avatar_url 
-            FROM users u
-            JOIN messages m ON (u.id = m.sender_id OR u.id = m.receiver_id)
-            WHERE (m.sender_id = %s OR m.receiver_id = %s) AND u.id != %s
+            SELECT u.id, u.username, u.badge_type, u.avatar_url,
+                   c.last_message_id, c.last_sender_id, c.last_preview, c.last_at, c.unread_count
+            FROM conversations c
+            JOIN users u ON u.id = c.peer_id
+            WHERE c.user_id = %s AND c.peer_id != %s
+            ORDER BY c.last_message_id DESC
         ''' if self.database_url else '''
-            SELECT DISTINCT u.id, u.username, u.badge_type, u.avatar_url 
-            FROM users u
-            JOIN messages m ON (u.id = m.sender_id OR u.id = m.receiver_id)
-            WHERE (m.sender_id = ? OR m.receiver_id = ?) AND u.id != ?
+            SELECT u.id, u.username, u.badge_type, u.avatar_url,
+                   c.last_message_id, c.last_sender_id, c.last_preview, c.last_at, c.unread_count
+            FROM conversations c
+            JOIN users u ON u.id = c.peer_id
+            WHERE c.user_id = ? AND c.peer_id != ?
+            ORDER BY c.last_message_id DESC
         '''
-        cur.execute(sql, (user_id, user_id, user_id))
+        cur.execute(sql, (user_id, user_id))
         res = [dict(r) for r in cur.fetchall()]
         cur.close()
         conn.close()
         return res
 
+    def mark_conversation_read(self, user_id, peer_id):
+        conn = self.get_connection()
+        cur = conn.cursor()
+        sql = "UPDATE conversations SET unread_count = 0 WHERE user_id = %s AND peer_id = %s" if self.database_url else "UPDATE conversations SET unread_count = 0 WHERE user_id = ? AND peer_id = ?"
+        cur.execute(sql, (user_id, peer_id))
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+
     def update_user_profile(self, user_id, bio=None, avatar_url=None):
         conn = self.get_connection()
         cur = conn.cursor()
@@ -355,13 +1021,120 @@ class BillboardManager:
             sql = "UPDATE users SET bio = %s WHERE id = %s" if self.database_url else "UPDATE users SET bio = ? WHERE id = ?"
             cur.execute(sql, (bio, user_id))
         if avatar_url:
+            cur.execute("SELECT avatar_url FROM users WHERE id = %s" if self.database_url else "SELECT avatar_url FROM users WHERE id = ?", (user_id,))
+            previous = cur.fetchone()
             sql = "UPDATE users SET avatar_url = %s WHERE id = %s" if self.database_url else "UPDATE users SET avatar_url = ? WHERE id = ?"
             cur.execute(sql, (avatar_url, user_id))
+            self._incref_media(cur, avatar_url)
+            if previous:
+                self._decref_media(cur, previous[0])
         conn.commit()
         cur.close()
         conn.close()
+        self._user_changed(user_id)
+        if avatar_url:
+            self.collect_media_garbage()
+            self.thumbnails.submit(avatar_url, "avatar")
+            self.refresh_hot_feed_author(user_id)
         return True
 
+    # --- MEDIA REFERENCES ---
+    # Content-addressed files are shared, so they are only removed once no
+    # live post or avatar points at them. A released file is kept for
+    # MEDIA_GC_GRACE_SECONDS so an upload that deduplicated onto it moments
+    # earlier can still claim it. Freshly stored files start out released
+    # (stage_media), so one whose post or profile update never commits is
+    # collected like any other.
+    def stage_media(self, media_url):
+        if not self.media_store.is_managed(media_url):
+            return
+        ph = "%s" if self.database_url else "?"
+        conn = self.get_connection()
+        cur = conn.cursor()
+        # A re-upload of released content restarts its grace period
+        cur.execute(f'''
+            INSERT INTO media_refs (media_url, refcount, released_at) VALUES ({ph}, 0, {ph})
+            ON CONFLICT (media_url) DO UPDATE SET
+                released_at = CASE WHEN media_refs.refcount <= 0 THEN excluded.released_at ELSE media_refs.released_at END
+        ''', (media_url, time.time()))
+        conn.commit()
+        cur.close()
+        conn.close()
+
+    def _incref_media(self, cur, media_url):
+        if not self.media_store.is_managed(media_url):
+            return
+        sql = '''
+            INSERT INTO media_refs (media_url, refcount, released_at) VALUES (%s, 1, NULL)
+            ON CONFLICT (media_url) DO UPDATE SET refcount = media_refs.refcount + 1, released_at = NULL
+        ''' if self.database_url else '''
+            INSERT INTO media_refs (media_url, refcount, released_at) VALUES (?, 1, NULL)
+            ON CONFLICT (media_url) DO UPDATE SET refcount = media_refs.refcount + 1, released_at = NULL
+        '''
+        cur.execute(sql, (media_url,))
+
+    def _decref_media(self, cur, media_url):
+        if not self.media_store.is_managed(media_url):
+            return
+        sql = '''
+            UPDATE media_refs SET refcount = refcount - 1,
+                released_at = CASE WHEN refcount - 1 <= 0 THEN %s ELSE released_at END
+            WHERE media_url = %s
+        ''' if self.database_url else '''
+            UPDATE media_refs SET refcount = refcount - 1,
+                released_at = CASE WHEN refcount - 1 <= 0 THEN ? ELSE released_at END
+            WHERE media_url = ?
+        '''
+        cur.execute(sql, (time.time(), media_url))
+
+    def collect_media_garbage(self, grace=None):
+        """Deletes content-addressed files whose last reference went away more than `grace` seconds ago.
+
+        Each file is claimed (renamed to a tombstone) before its row is
+        deleted. A file that was re-referenced, re-staged or re-uploaded
+        meanwhile is restored, so a concurrent upload of the same content
+        never ends up pointing at a deleted file.
+        """
+        if not self._media_gc_lock.acquire(blocking=False):
+            return []  # another sweep is running
+        try:
+            return self._collect_media_garbage(self.media_gc_grace if grace is None else grace)
+        finally:
+            self._media_gc_lock.release()
+
+    def _collect_media_garbage(self, grace):
+        ph = "%s" if self.database_url else "?"
+        conn = self.get_connection()
+        cur = conn.cursor()
+        cur.execute(f"SELECT media_url FROM media_refs WHERE refcount <= 0 AND released_at < {ph}", (time.time() - grace,))
+        candidates = [r[0] for r in cur.fetchall()]
+        conn.commit()
+        removed = []
+        for media_url in candidates:
+            if self.media_store.recently_touched(media_url, grace):
+                continue
+            tombstone = self.media_store.claim(media_url)
+            # Re-checked after the claim: stage_media and _incref_media both clear the condition
+            cur.execute(f"DELETE FROM media_refs WHERE media_url = {ph} AND refcount <= 0 AND released_at < {ph}",
+                        (media_url, time.time() - grace))
+            deleted = cur.rowcount == 1
+            conn.commit()
+            if tombstone is None:
+                continue
+            if deleted and time.time() - os.path.getmtime(tombstone) >= grace:
+                os.unlink(tombstone)
+                removed.append(media_url)
+            else:
+                self.media_store.restore(media_url, tombstone)
+                if deleted:
+                    # Uploaded again just before the claim; track it as staged
+                    self.stage_media(media_url)
+        cur.close()
+        conn.close()
+        for media_url in removed:
+            self.thumbnails.discard(media_url)
+        return removed
+
     # --- PAYMENTS & PROMOTIONS ---
     def initiate_simulated_payment(self, user_id, item_id, amount):
         pid = secrets.token_hex(8)
@@ -409,6 +1182,8 @@ class BillboardManager:
         conn.commit()
         cur.close()
         conn.close()
+        self._user_changed(user_id)
+        self.refresh_hot_feed_author(user_id)
         return True
 
     def get_pending_simulated_payments(self):
@@ -420,6 +1195,32 @@ class BillboardManager:
         conn.close()
         return res
 
+    def get_channel_member_ids(self, channel_id):
+        conn = self.get_connection()
+        cur = conn.cursor()
+        sql = "SELECT user_id FROM channel_memberships WHERE channel_id = %s" if self.database_url else "SELECT user_id FROM channel_memberships WHERE channel_id = ?"
+        cur.execute(sql, (channel_id,))
+        res = [r[0] for r in cur.fetchall()]
+        cur.close()
+        conn.close()
+        return res
+
+    def get_channel_members_among(self, channel_id, user_ids):
+        """The subset of user_ids that are members of the channel."""
+        ph = "%s" if self.database_url else "?"
+        user_ids = list(user_ids)
+        res = []
+        conn = self.get_connection()
+        cur = conn.cursor()
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i + 500]
+            cur.execute(f"SELECT user_id FROM channel_memberships WHERE channel_id = {ph} AND user_id IN ({', '.join([ph] * len(chunk))})",
+                        (channel_id, *chunk))
+            res.extend(r[0] for r in cur.fetchall())
+        cur.close()
+        conn.close()
+        return res
+
     def is_channel_member(self, user_id, channel_id):
         conn = self.get_connection()
         cur = conn.cursor()
@@ -434,26 +1235,355 @@ class BillboardManager:
         conn = self.get_connection()
         cur = conn.cursor()
         sql = "INSERT INTO channel_memberships (user_id, channel_id) VALUES (%s, %s)" if self.database_url else "INSERT INTO channel_memberships (user_id, channel_id) VALUES (?, ?)"
+        count_sql = "UPDATE channels SET member_count = member_count + 1 WHERE id = %s" if self.database_url else "UPDATE channels SET member_count = member_count + 1 WHERE id = ?"
+        joined = False
         try:
             cur.execute(sql, (user_id, channel_id))
+            cur.execute(count_sql, (channel_id,))
             conn.commit()
+            joined = True
         except: pass # Already a member
         cur.close()
         conn.close()
+        if joined:
+            # Start new members at the channel's current position, not its whole history
+            self.mark_read(user_id, "nodes", channel_id=channel_id)
+            if self.timeline_strategy == "push" and not self._pulls_channel(channel_id):
+                self._backfill_inbox(user_id, channel_id)
+        return True
+
+    def get_user_channel_ids(self, user_id):
+        conn = self.get_connection()
+        cur = conn.cursor()
+        sql = "SELECT channel_id FROM channel_memberships WHERE user_id = %s" if self.database_url else "SELECT channel_id FROM channel_memberships WHERE user_id = ?"
+        cur.execute(sql, (user_id,))
+        res = [r[0] for r in cur.fetchall()]
+        cur.close()
+        conn.close()
+        return res
+
+    # --- HOME TIMELINE ---
+    # The wall plus every channel the user belongs to, newest first.
+    # pull: one page per source (mostly served by the hot feeds), k-way merged by id.
+    # push: after create_post commits, the fanout queue copies channel post ids
+    #       into each member's timeline_inbox rows in the background, so a read
+    #       is the wall merged with one inbox index range. Channels above
+    #       FANOUT_MAX_MEMBERS are not fanned out and are pulled as above.
+    def _pulls_channel(self, channel_id):
+        """True if push mode reads this channel at read time instead of via inboxes.
+
+        member_count only grows, and writers and readers share the directory
+        snapshot, so once a channel is pulled its posts are never expected in
+        inboxes. Posts fanned out before it crossed the limit are merged away.
+        """
+        return channel_id in self.channels.larger_than(self.fanout_max_members)
+
+    def _fans_out(self, channel_id):
+        return bool(channel_id) and self.timeline_strategy == "push" and not self._pulls_channel(channel_id)
+
+    def _write_inbox_rows(self, rows):
+        """Inserts (user_id, post_id) inbox rows in one transaction; existing rows are skipped."""
+        sql = "INSERT INTO timeline_inbox (user_id, post_id) VALUES (%s, %s) ON CONFLICT DO NOTHING" if self.database_url else "INSERT INTO timeline_inbox (user_id, post_id) VALUES (?, ?) ON CONFLICT DO NOTHING"
+        conn = self.get_connection()
+        cur = conn.cursor()
+        try:
+            # The fanout worker retries failures, so the connection must go back to the pool either way
+            cur.executemany(sql, rows)
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+    def _finish_fanout_jobs(self, post_ids):
+        ph = "%s" if self.database_url else "?"
+        conn = self.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(f"DELETE FROM fanout_jobs WHERE post_id IN ({', '.join([ph] * len(post_ids))})", post_ids)
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+    def get_fanout_stats(self):
+        stats = self.fanout.stats()
+        stats["strategy"] = self.timeline_strategy
+        stats["max_members"] = self.fanout_max_members
+        stats["pulled_channels"] = len(self.channels.larger_than(self.fanout_max_members))
+        return stats
+
+    def _backfill_inbox(self, user_id, channel_id):
+        """Copies a channel's recent posts into a new member's inbox."""
+        ph = "%s" if self.database_url else "?"
+        conn = self.get_connection()
+        cur = conn.cursor()
+        cur.execute(f'''
+            INSERT INTO timeline_inbox (user_id, post_id)
+            SELECT {ph}, id FROM posts
+            WHERE channel_id = {ph} AND is_deleted = 0
+            ORDER BY id DESC LIMIT {ph}
+            ON CONFLICT DO NOTHING
+        ''', (user_id, channel_id, self.inbox_backfill))
+        cur.execute(f"UPDATE channel_memberships SET inbox_backfilled = 1 WHERE user_id = {ph} AND channel_id = {ph}", (user_id, channel_id))
+        conn.commit()
+        cur.close()
+        conn.close()
+
+    def sync_timeline_inboxes(self):
+        """Startup: brings every membership's inbox up to date with the current strategy.
+
+        In push mode, memberships that predate it (joined under pull, or before
+        inboxes existed) get the same recent-posts backfill a join does.
+        Channels that are pulled anyway are skipped. In pull mode no inboxes
+        are written, so every membership is marked stale for the next switch
+        to push. Push mode also resubmits the fan-outs still listed in
+        fanout_jobs, i.e. those a crash cut short or that kept failing.
+        """
+        ph = "%s" if self.database_url else "?"
+        conn = self.get_connection()
+        cur = conn.cursor()
+        if self.timeline_strategy == "push":
+            cur.execute(f'''
+                INSERT INTO timeline_inbox (user_id, post_id)
+                SELECT m.user_id, p.id
+                FROM channel_memberships m
+                JOIN channels c ON c.id = m.channel_id
+                JOIN posts p ON p.channel_id = m.channel_id
+                WHERE m.inbox_backfilled = 0 AND c.member_count <= {ph} AND p.id IN (
+                    SELECT r.id FROM posts r
+                    WHERE r.channel_id = m.channel_id AND r.is_deleted = 0
+                    ORDER BY r.id DESC LIMIT {ph}
+                )
+                ON CONFLICT DO NOTHING
+            ''', (self.fanout_max_members, self.inbox_backfill))
+            if cur.rowcount:
+                print(f"[Database] Backfilled {cur.rowcount} timeline inbox rows for existing memberships")
+            cur.execute("UPDATE channel_memberships SET inbox_backfilled = 1 WHERE inbox_backfilled = 0")
+            # Fan-outs that a crash cut short or that kept failing
+            cur.execute("SELECT channel_id, post_id FROM fanout_jobs ORDER BY post_id")
+            unfinished = cur.fetchall()
+        else:
+            cur.execute("UPDATE channel_memberships SET inbox_backfilled = 0 WHERE inbox_backfilled = 1")
+            cur.execute("DELETE FROM fanout_jobs")
+            unfinished = []
+        conn.commit()
+        cur.close()
+        conn.close()
+        if unfinished:
+            print(f"[Database] Resuming fan-out of {len(unfinished)} posts")
+        for channel_id, post_id in unfinished:
+            self.fanout.submit(channel_id, post_id)
+
+    def _get_inbox_page(self, user_id, limit, after_id=0, before_id=None):
+        # Driven by the inbox primary key (user_id, post_id), like _get_posts_page is by post id
+        ph = "%s" if self.database_url else "?"
+        where, params, order = f"i.user_id = {ph}", (user_id,), "DESC"
+        if before_id:
+            where, params = f"{where} AND i.post_id < {ph}", params + (before_id,)
+        elif after_id:
+            where, params, order = f"{where} AND i.post_id > {ph}", params + (after_id,), "ASC"
+        conn = self.get_connection()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
+        sql = f'''
+            SELECT p.*, u.username, u.badge_type, u.avatar_url as user_avatar
+            FROM timeline_inbox i
+            JOIN posts p ON p.id = i.post_id
+            JOIN users u ON p.user_id = u.id
+            WHERE {where} AND p.is_deleted = 0
+            ORDER BY i.post_id {order} LIMIT {ph}
+        '''
+        cur.execute(sql, params + (limit,))
+        res = [dict(r) for r in cur.fetchall()]
+        cur.close()
+        conn.close()
+        if order == "ASC":
+            res.reverse()
+        return self.with_media_variants(res)
+
+    def _merge_sources(self, sources, limit, after_id, before_id):
+        """k-way merge of newest-first pages from several timelines into one page."""
+        pages = [fetch(limit, after_id, before_id) for fetch in sources]
+        if after_id and not before_id:
+            # Each source returned its `limit` oldest posts above the cursor; keep the oldest overall
+            merged = heapq.merge(*[reversed(p) for p in pages], key=lambda r: r["id"])
+            return self._unique_ids(merged, limit)[::-1]
+        return self._unique_ids(heapq.merge(*pages, key=lambda r: -r["id"]), limit)
+
+    def _unique_ids(self, merged, limit):
+        # A post can come from both an inbox and a pulled channel; merged rows are id-ordered
+        res = []
+        for row in merged:
+            if res and res[-1]["id"] == row["id"]:
+                continue
+            res.append(row)
+            if len(res) == limit:
+                break
+        return res
+
+    def _timeline_sources(self, user_id):
+        sources = [lambda limit, after_id, before_id: self.get_feed(limit, after_id, before_id)]
+        if self.timeline_strategy == "push":
+            sources.append(lambda limit, after_id, before_id: self._get_inbox_page(user_id, limit, after_id, before_id))
+            pulled = self.channels.larger_than(self.fanout_max_members)
+            channel_ids = [cid for cid in self.get_user_channel_ids(user_id) if cid in pulled] if pulled else []
+        else:
+            channel_ids = self.get_user_channel_ids(user_id)
+        for channel_id in channel_ids:
+            sources.append(lambda limit, after_id, before_id, cid=channel_id: self._get_channel_posts(cid, limit, after_id, before_id))
+        return sources
+
+    def get_home_timeline(self, user_id, cursor=None, limit=50, after_id=0, before_id=None):
+        sources = self._timeline_sources(user_id)
+        fetch = lambda limit, after_id, before_id: self._merge_sources(sources, limit, after_id, before_id)
+        return self._paginate(fetch, limit, after_id, before_id, cursor)
+
+    # --- UNREAD COUNTERS ---
+    # Each timeline has a monotonic counter in feed_counters that create_post
+    # bumps in the same transaction as the insert; a reader's marker remembers
+    # the counter value they last saw. /unreads is then a handful of primary
+    # key lookups instead of COUNT(*) over posts. Soft-deleted posts still
+    # count, since counters never go backwards.
+    def _bump_feed_counter(self, cur, category, post_id):
+        sql = '''
+            INSERT INTO feed_counters (category, seq, last_post_id) VALUES (%s, 1, %s)
+            ON CONFLICT (category) DO UPDATE SET seq = feed_counters.seq + 1, last_post_id = excluded.last_post_id
+        ''' if self.database_url else '''
+            INSERT INTO feed_counters (category, seq, last_post_id) VALUES (?, 1, ?)
+            ON CONFLICT (category) DO UPDATE SET seq = feed_counters.seq + 1, last_post_id = excluded.last_post_id
+        '''
+        cur.execute(sql, (category, post_id))
+
+    def _skip_own_post(self, cur, user_id, category, post_id):
+        # The author's marker moves past their own post in the same transaction,
+        # leaving anything else they had not read still unread. Without a marker,
+        # wall/pulse start from "everything read" as on a first visit; nodes count
+        # from zero, so the marker only covers this post.
+        ph = "%s" if self.database_url else "?"
+        cur.execute(f'''
+            INSERT INTO last_read_markers (user_id, category, last_post_id, last_seq)
+            SELECT {ph}, category, last_post_id, CASE WHEN category IN ('wall', 'pulse') THEN seq ELSE 1 END
+            FROM feed_counters WHERE category = {ph}
+            ON CONFLICT (user_id, category) DO UPDATE SET
+                last_post_id = {ph},
+                last_seq = last_read_markers.last_seq + 1
+        ''', (user_id, category, post_id))
+
+    def _set_markers_sql(self, source):
+        # `source` yields (category, last_post_id, seq) rows for the given user
+        ph = "%s" if self.database_url else "?"
+        return f'''
+            INSERT INTO last_read_markers (user_id, category, last_post_id, last_seq)
+            SELECT {ph}, category, last_post_id, seq FROM ({source}) src WHERE 1 = 1
+            ON CONFLICT (user_id, category) DO UPDATE SET
+                last_post_id = excluded.last_post_id,
+                last_seq = excluded.last_seq
+        '''
+
+    def get_unreads(self, user_id):
+        ph = "%s" if self.database_url else "?"
+        conn = self.get_connection()
+        cur = conn.cursor()
+        cur.execute(f'''
+            SELECT c.category, c.seq, m.last_seq
+            FROM feed_counters c
+            LEFT JOIN last_read_markers m ON m.user_id = {ph} AND m.category = c.category
+            WHERE c.category IN ('wall', 'pulse')
+        ''', (user_id,))
+        counts = {"wall": 0, "pulse": 0, "nodes": 0, "chats": 0}
+        unmarked = []
+        for category, seq, last_seq in cur.fetchall():
+            if last_seq is None:
+                # First visit: start from "everything read" rather than the whole history
+                unmarked.append(category)
+            else:
+                counts[category] = max(0, seq - last_seq)
+
+        cur.execute(f'''
+            SELECT COALESCE(SUM(c.seq - COALESCE(m.last_seq, 0)), 0)
+            FROM channel_memberships cm
+            JOIN feed_counters c ON c.category = 'node:' || cm.channel_id
+            LEFT JOIN last_read_markers m ON m.user_id = cm.user_id AND m.category = c.category
+            WHERE cm.user_id = {ph}
+        ''', (user_id,))
+        counts["nodes"] = max(0, int(cur.fetchone()[0]))
+
+        cur.execute(f"SELECT COALESCE(SUM(unread_count), 0) FROM conversations WHERE user_id = {ph}", (user_id,))
+        counts["chats"] = int(cur.fetchone()[0])
+
+        if unmarked:
+            cur.execute(self._set_markers_sql(f"SELECT category, last_post_id, seq FROM feed_counters WHERE category IN ({', '.join([ph] * len(unmarked))})"), (user_id, *unmarked))
+            conn.commit()
+        cur.close()
+        conn.close()
+        return counts
+
+    def mark_read(self, user_id, category, channel_id=None, peer_id=None):
+        """Moves the user's high-water mark for a category to the current position."""
+        if category == "chats":
+            if peer_id:
+                return self.mark_conversation_read(user_id, peer_id)
+            conn = self.get_connection()
+            cur = conn.cursor()
+            sql = "UPDATE conversations SET unread_count = 0 WHERE user_id = %s AND unread_count > 0" if self.database_url else "UPDATE conversations SET unread_count = 0 WHERE user_id = ? AND unread_count > 0"
+            cur.execute(sql, (user_id,))
+            conn.commit()
+            cur.close()
+            conn.close()
+            return True
+
+        ph = "%s" if self.database_url else "?"
+        if category in ("wall", "pulse"):
+            source, args = f"SELECT category, last_post_id, seq FROM feed_counters WHERE category = {ph}", (category,)
+        elif category == "nodes" and channel_id:
+            source, args = f"SELECT category, last_post_id, seq FROM feed_counters WHERE category = {ph}", (f"node:{channel_id}",)
+        elif category == "nodes":
+            source = f'''
+                SELECT c.category, c.last_post_id, c.seq
+                FROM channel_memberships cm
+                JOIN feed_counters c ON c.category = 'node:' || cm.channel_id
+                WHERE cm.user_id = {ph}
+            '''
+            args = (user_id,)
+        else:
+            raise ValueError(f"Unknown unread category: {category}")
+        conn = self.get_connection()
+        cur = conn.cursor()
+        cur.execute(self._set_markers_sql(source), (user_id, *args))
+        conn.commit()
+        cur.close()
+        conn.close()
         return True
 
-    # Mock stats for Dashboard
-    def get_online_users(self): return random.randint(5, 15)
-    def get_total_users(self): return 100 
-    def get_total_posts(self): return 500 
-    def get_total_channels(self): return 10 
+    # --- LIVE STATS ---
+    # Totals are held in memory (see LiveStats) and only recounted every
+    # STATS_RESYNC_SECONDS; "online" comes from the presence tracker.
+    def count_totals(self):
+        conn = self.get_connection()
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT (SELECT COUNT(*) FROM users),
+                   (SELECT COUNT(*) FROM posts WHERE is_deleted = 0),
+                   (SELECT COUNT(*) FROM channels)
+        ''')
+        users, posts, channels = cur.fetchone()
+        cur.close()
+        conn.close()
+        return {"users": users, "posts": posts, "channels": channels}
+
+    def touch_presence(self, user_id):
+        self.presence.touch(user_id)
+
+    def get_online_users(self): return self.presence.count()
+    def get_total_users(self): return self.live_stats.get("users")
+    def get_total_posts(self): return self.live_stats.get("posts")
+    def get_total_channels(self): return self.live_stats.get("channels")
 
     # --- ADMIN & MODERATION ---
     def create_dev_application(self, user_id, details, cert_url):
         conn = self.get_connection()
         cur = conn.cursor()
         sql = "CREATE TABLE IF NOT EXISTS dev_applications (id SERIAL PRIMARY KEY, user_id INTEGER, details TEXT, cert_url TEXT, status TEXT DEFAULT 'pending')"
-        cur.execute(sql)
+        cur.execute(self.ddl(sql))
         ins = "INSERT INTO dev_applications (user_id, details, cert_url) VALUES (%s, %s, %s)" if self.database_url else "INSERT INTO dev_applications (user_id, details, cert_url) VALUES (?, ?, ?)"
         cur.execute(ins, (user_id, details, cert_url))
         conn.commit()
@@ -479,44 +1609,69 @@ class BillboardManager:
         # Update app status
         cur.execute("UPDATE dev_applications SET status = 'approved' WHERE id = %s" if self.database_url else "UPDATE dev_applications SET status = 'approved' WHERE id = ?", (app_id,))
         # Update user badge
-        cur.execute("UPDATE users SET badge_type = 'dev' WHERE id = %s" if self.database_url else "UPDATE users SET badge_type = ? WHERE id = ?", (uid,))
+        cur.execute("UPDATE users SET badge_type = 'dev' WHERE id = %s" if self.database_url else "UPDATE users SET badge_type = 'dev' WHERE id = ?", (uid,))
         conn.commit()
         cur.close()
         conn.close()
+        self._user_changed(uid)
+        self.refresh_hot_feed_author(uid)
         return True
 
     def delete_post(self, post_id):
         conn = self.get_connection()
         cur = conn.cursor()
-        sql = "UPDATE posts SET is_deleted = 1 WHERE id = %s" if self.database_url else "UPDATE posts SET is_deleted = 1 WHERE id = ?"
+        sql = "UPDATE posts SET is_deleted = 1 WHERE id = %s AND is_deleted = 0" if self.database_url else "UPDATE posts SET is_deleted = 1 WHERE id = ? AND is_deleted = 0"
         cur.execute(sql, (post_id,))
+        deleted = cur.rowcount == 1
+        cur.execute("SELECT media_url, channel_id FROM posts WHERE id = %s" if self.database_url else "SELECT media_url, channel_id FROM posts WHERE id = ?", (post_id,))
+        media_url, channel_id = cur.fetchone() or (None, None)
+        if deleted:
+            self._decref_media(cur, media_url)
         conn.commit()
         cur.close()
         conn.close()
+        if deleted:
+            self.live_stats.incr("posts", -1)
+            self.collect_media_garbage()
+        for feed in self.hot_feeds.values():
+            feed.remove(post_id)
+        self.channel_feeds.remove(post_id)
+        if self.listeners:
+            # Channel post ids only go to members, like the channel_post event itself
+            audience = (lambda user_ids: self.get_channel_members_among(channel_id, user_ids)) if channel_id else None
+            self.emit("post_deleted", {"id": post_id}, audience)
         return True
 
     def mute_user(self, username):
         conn = self.get_connection()
         cur = conn.cursor()
-        sql = "UPDATE users SET is_muted = 1 WHERE username = %s" if self.database_url else "UPDATE users SET is_muted = ? WHERE username = ?"
+        cur.execute("SELECT id FROM users WHERE username = %s" if self.database_url else "SELECT id FROM users WHERE username = ?", (username,))
+        res = cur.fetchone()
+        sql = "UPDATE users SET is_muted = 1 WHERE username = %s" if self.database_url else "UPDATE users SET is_muted = 1 WHERE username = ?"
         cur.execute(sql, (username,))
         conn.commit()
         cur.close()
         conn.close()
+        if res:
+            # Signed-in sessions must see the mute on their next request
+            self._user_changed(res[0])
         return True
 
-    def report_post(self, post_id, user_id):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        sql = "CREATE TABLE IF NOT EXISTS reports (id SERIAL PRIMARY KEY, post_id INTEGER, user_id INTEGER, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
-        cur.execute(sql)
+    def _insert_report(self, cur, post_id, user_id):
         ins = "INSERT INTO reports (post_id, user_id) VALUES (%s, %s)" if self.database_url else "INSERT INTO reports (post_id, user_id) VALUES (?, ?)"
         cur.execute(ins, (post_id, user_id))
-        conn.commit()
-        cur.close()
-        conn.close()
+
+    def report_post(self, post_id, user_id):
+        self._write(self._insert_report, post_id, user_id)
         return True
 
+    def queue_report(self, post_id, user_id):
+        """Write-behind only: queues the insert and returns its Future; see _write."""
+        return self.write_behind.submit(self._insert_report, post_id, user_id)
+
+    def get_write_behind_stats(self):
+        return self.write_behind.stats() if self.write_behind else {"enabled": False}
+
     def get_all_reports(self):
         conn = self.get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if self.database_url else conn.cursor()
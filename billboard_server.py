@@ -1,16 +1,24 @@
 from fastapi import FastAPI, Request, HTTPException, Form, File, UploadFile, Depends, BackgroundTasks, status, Query
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, Dict
+from contextlib import asynccontextmanager
 import os
 import secrets
 import datetime
 import mimetypes
 import logging
 import json
+import asyncio
 import uvicorn
 from billboard_logic import BillboardManager
+from db_executor import DBExecutor, LoopLagMonitor
+from realtime import EventHub
+from media_files import MediaFiles
+from spa_shell import SpaShell
+from sessions import public_user
+from uploads import save_upload, UploadTooLarge
 from pydantic import BaseModel
 
 class VerifyEmailBody(BaseModel):
@@ -18,8 +26,49 @@ class VerifyEmailBody(BaseModel):
     code: str
     user_data: dict
 
+# Database Manager, DB thread pool and SPA shell are built in lifespan(), not at
+# import time: the spawned thumbnail workers re-import this module as __mp_main__
+# and must not open the database, start background threads or load the shell.
+db = None
+db_executor = None
+shell = None
+loop_monitor = LoopLagMonitor(interval=float(os.environ.get("LOOP_LAG_INTERVAL", "0.05")))
+
+# Server push: committed writes are fanned out to /events subscribers
+hub = EventHub(keepalive=float(os.environ.get("SSE_KEEPALIVE", "15")))
+
+async def run_db(fn, *args, **kwargs):
+    # Blocking DB work runs on a bounded thread pool so one slow query cannot stall the loop
+    return await db_executor.run(fn, *args, **kwargs)
+
+@asynccontextmanager
+async def lifespan(app):
+    global db, db_executor, shell
+    db = BillboardManager("studio_billboard.db")
+    db_executor = DBExecutor(
+        max_workers=int(os.environ.get("DB_THREADS", str(db.pool.max_size))),
+        mode=os.environ.get("DB_EXECUTION_MODE", "threadpool"),
+    )
+    # The SPA shell is served from memory, precompressed; see spa_shell.py
+    shell = SpaShell("billboard.html")
+    db.add_listener(hub.publish)
+    hub.bind(asyncio.get_running_loop())
+    loop_monitor.start()
+    media_gc = asyncio.get_running_loop().create_task(sweep_media(float(os.environ.get("MEDIA_GC_INTERVAL_SECONDS", "300"))))
+    yield
+    media_gc.cancel()
+    await loop_monitor.stop()
+    db_executor.shutdown()
+    if db.write_behind:
+        db.write_behind.close()
+    db.fanout.close()
+    db.thumbnails.shutdown()
+    db.auth_service.outbox.close()
+    db.auth_service.smtp_pool.close()
+    db.passwords.shutdown()
+
 # Initialize FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # --- SELF-HEALING DIRECTORIES ---
 for d in ["static", "uploads", "uploads/dev_certs"]:
@@ -38,10 +87,7 @@ app.add_middleware(
 
 # Static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-
-# Database Manager
-db = BillboardManager("studio_billboard.db")
+app.mount("/uploads", MediaFiles(directory="uploads"), name="uploads")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, filename='billboard.log',
@@ -70,14 +116,71 @@ class LoginData(BaseModel):
     username: str
     password: str
 
+# --- SESSIONS ---
+def bearer_token(request: Request):
+    auth = request.headers.get("authorization", "")
+    if auth[:7].lower() == "bearer ":
+        return auth[7:].strip()
+    # EventSource cannot set headers, so /events passes the token in the query string
+    return request.query_params.get("token")
+
+async def current_user(request: Request):
+    """Dependency: the signed-in user, resolved from the session cache (DB only on a miss)."""
+    token = bearer_token(request)
+    user = db.get_cached_session_user(token)
+    if user is None and token:
+        user = await run_db(db.get_session_user, token)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not signed in.")
+    return user
+
+def require_self(user, user_id):
+    if user['id'] != user_id:
+        raise HTTPException(status_code=403, detail="Session does not belong to this user.")
+
+async def store_upload(upload, directory, filename):
+    """Streams an upload into directory/filename, mapping size violations to 413."""
+    os.makedirs(directory, exist_ok=True)
+    file_path = os.path.join(directory, filename)
+    try:
+        await save_upload(upload, file_path)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return file_path
+
+async def store_media(upload, default_ext):
+    """Stores avatar/post media in the content-addressed store and returns its URL."""
+    ext = mimetypes.guess_extension(upload.content_type) or default_ext
+    try:
+        media_url = await db.media_store.store(upload, ext)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    await run_db(db.stage_media, media_url)
+    return media_url
+
+async def sweep_media(interval):
+    # Released files only become collectable once their grace period is over,
+    # so the sweeps run by delete_post and profile updates miss them; this one doesn't
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await run_db(db.collect_media_garbage)
+            if removed:
+                print(f"[Media] Removed {len(removed)} unreferenced files")
+        except Exception as e:
+            print(f"[Media Error] Garbage sweep failed: {e}")
+
 # --- ROUTES ---
 
-@app.get("/", response_class=FileResponse)
-async def read_root():
-    return FileResponse("billboard.html")
+@app.get("/", response_class=HTMLResponse)
+async def read_root(request: Request):
+    return shell.response(request)
 
 @app.get("/status")
 async def get_status():
+    # Served from memory; the DB is only recounted once the snapshot goes stale
+    if db.live_stats.is_stale():
+        await run_db(db.live_stats.resync)
     return {
         "status": "ok", 
         "users_online": db.get_online_users(), 
@@ -88,63 +191,79 @@ async def get_status():
 
 @app.post("/register")
 async def register(data: RegisterData):
-    if db.get_user_by_username(data.username) or db.get_user_by_email(data.email):
+    if await run_db(db.get_user_by_username, data.username) or await run_db(db.get_user_by_email, data.email):
         raise HTTPException(status_code=400, detail="Username or Email already registered.")
     
-    user_id = db.create_user(data.username, data.password, data.email, data.phone, data.full_names, data.home_address)
+    password_hash = await db.passwords.hash_async(data.password)
+    user_id = await run_db(db.create_user, data.username, data.password, data.email, data.phone, data.full_names, data.home_address, password_hash=password_hash)
     if user_id:
         return {"message": "Verification email sent.", "user_id": user_id}
     raise HTTPException(status_code=500, detail="User registration failed.")
 
 @app.post("/verify-email")
 async def verify_email(body: VerifyEmailBody):
-    if db.verify_email(body.email, body.code):
-        user = db.get_user_by_email(body.email)
-        return {"message": "Email verified successfully.", "user_id": user['id']}
+    try:
+        verified = await run_db(db.verify_email, body.email, body.code)
+    except PermissionError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    if verified:
+        # Only the request that consumed the single-use code gets a session
+        user = await run_db(db.get_user_by_email, body.email)
+        token = await run_db(db.create_session, user['id'])
+        return {"message": "Email verified successfully.", "user_id": user['id'], "token": token, "user": public_user(user)}
     raise HTTPException(status_code=400, detail="Invalid verification code.")
 
 @app.post("/login")
 async def login(data: LoginData):
-    user = db.get_user_by_username(data.username)
-    hashed_pw = db.hash_password(data.password)
-    if user and user['password'] == hashed_pw:
-        return user
+    user = await run_db(db.get_user_by_username, data.username)
+    ok, needs_rehash = await db.passwords.verify_async(data.password, user['password'] if user else None)
+    if ok:
+        if needs_rehash:
+            # Legacy SHA-256 or outdated scrypt cost: upgrade now that we have the plaintext
+            new_hash = await db.passwords.hash_async(data.password)
+            await run_db(db.update_password_hash, user['id'], user['password'], new_hash)
+        db.touch_presence(user['id'])
+        token = await run_db(db.create_session, user['id'])
+        return {"token": token, "user": public_user(user)}
     raise HTTPException(status_code=401, detail="Invalid credentials.")
 
+@app.post("/logout")
+async def logout(request: Request):
+    token = bearer_token(request)
+    if token:
+        await run_db(db.revoke_session, token)
+    return {"message": "Signed out"}
+
 @app.get("/get-user/{username}")
 async def get_user_profile(username: str):
-    user = db.get_user_by_username(username)
-    if user: return user
+    user = await run_db(db.get_user_by_username, username)
+    if user: return public_user(user)
     raise HTTPException(status_code=404, detail="User not found.")
 
 @app.get("/get-user-id/{user_id}")
 async def get_user_profile_id(user_id: int):
-    user = db.get_user_by_id(user_id)
-    if user: return user
+    user = await run_db(db.get_user_by_id, user_id)
+    if user: return public_user(user)
     raise HTTPException(status_code=404, detail="User not found.")
 
 @app.post("/update-profile")
-async def update_profile(user_id: int = Form(...), bio: Optional[str] = Form(None), avatar: Optional[UploadFile] = File(None)):
+async def update_profile(user_id: int = Form(...), bio: Optional[str] = Form(None), avatar: Optional[UploadFile] = File(None), user: dict = Depends(current_user)):
+    require_self(user, user_id)
     avatar_url = None
     if avatar:
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        ext = mimetypes.guess_extension(avatar.content_type) or ".jpg"
-        filename = f"{user_id}_av_{secrets.token_hex(4)}{ext}"
-        file_path = os.path.join(upload_dir, filename)
-        with open(file_path, "wb") as f: f.write(await avatar.read())
-        avatar_url = f"uploads/{filename}"
-
-    if db.update_user_profile(user_id, bio, avatar_url):
+        avatar_url = await store_media(avatar, ".jpg")
+
+    if await run_db(db.update_user_profile, user_id, bio, avatar_url):
         return {"message": "Profile updated", "avatar_url": avatar_url}
     raise HTTPException(status_code=500, detail="Update failed.")
 
 @app.post("/post")
-async def create_post(user_id: int = Form(...), content: str = Form(...), post_type: str = Form(...), channel_id: Optional[int] = Form(None), media: Optional[UploadFile] = File(None)):
-    user = db.get_user_by_id(user_id)
-    if not user: raise HTTPException(status_code=404, detail="User not found.")
+async def create_post(user_id: int = Form(...), content: str = Form(...), post_type: str = Form(...), channel_id: Optional[int] = Form(None), media: Optional[UploadFile] = File(None), user: dict = Depends(current_user)):
+    # Badge, mute and verification state come with the session; no user lookup here
+    require_self(user, user_id)
     if not user.get('is_email_verified'): raise HTTPException(status_code=403, detail="Email not verified.")
     if user.get('is_muted'): raise HTTPException(status_code=403, detail="Muted.")
+    db.touch_presence(user_id)
 
     # PERMISSION CHECK: Pulse (News) is DEV ONLY
     if post_type == 'news' and user.get('badge_type') != 'dev':
@@ -152,9 +271,10 @@ async def create_post(user_id: int = Form(...), content: str = Form(...), post_t
 
     # PERMISSION CHECK: Channels/Nodes are OWNER ONLY
     if channel_id:
-        channels = db.get_channels()
-        channel = next((c for c in channels if c['id'] == channel_id), None)
-        if channel and channel['owner_id'] != user_id:
+        channel = db.channels.get(channel_id) or await run_db(db.get_channel, channel_id)
+        if not channel:
+            raise HTTPException(status_code=404, detail="Channel not found.")
+        if channel['owner_id'] != user_id:
             raise HTTPException(status_code=403, detail="Only the Node creator can transmit in this channel.")
 
     media_url = None
@@ -162,58 +282,109 @@ async def create_post(user_id: int = Form(...), content: str = Form(...), post_t
     if media:
         if user.get('badge_type') == 'none' or not user.get('badge_type'):
             raise HTTPException(status_code=403, detail="Multimedia requires Verified status.")
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        ext = mimetypes.guess_extension(media.content_type) or ".bin"
-        filename = f"{user_id}_post_{secrets.token_hex(4)}{ext}"
-        file_path = os.path.join(upload_dir, filename)
-        with open(file_path, "wb") as f: f.write(await media.read())
-        media_url = f"uploads/{filename}"
+        media_url = await store_media(media, ".bin")
         media_type = media.content_type.split('/')[0]
 
-    db.create_post(user_id, content, post_type, channel_id, media_url, media_type)
+    if db.write_behind:
+        post_id = await asyncio.wrap_future(db.queue_post(user_id, content, post_type, channel_id, media_url, media_type))
+        await run_db(db.post_written, post_id, post_type, channel_id, media_url, media_type)
+    else:
+        await run_db(db.create_post, user_id, content, post_type, channel_id, media_url, media_type)
     return {"message": "Success"}
 
 @app.get("/get-channels")
-async def get_channels_api():
-    return db.get_channels()
+async def get_channels_api(request: Request):
+    if db.channels.is_stale():
+        await run_db(db.channels.reload)
+    body, etag = db.channels.snapshot()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [t.strip().removeprefix("W/") for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 @app.post("/create-channel")
-async def create_channel_api(data: ChannelCreate):
-    cid = db.create_channel(data.owner_id, data.name, data.description, data.price)
+async def create_channel_api(data: ChannelCreate, user: dict = Depends(current_user)):
+    require_self(user, data.owner_id)
+    cid = await run_db(db.create_channel, data.owner_id, data.name, data.description, data.price)
     return {"channel_id": cid}
 
 @app.get("/get-chats/{user_id}")
-async def get_chats_api(user_id: int):
-    return db.get_chats(user_id)
+async def get_chats_api(user_id: int, user: dict = Depends(current_user)):
+    require_self(user, user_id)
+    return await run_db(db.get_chats, user_id)
 
 @app.get("/get-messages/{user1}/{user2}")
-async def get_messages_api(user1: int, user2: int):
-    return db.get_messages(user1, user2)
+async def get_messages_api(user1: int, user2: int, after_id: int = Query(0), before_id: Optional[int] = Query(None), limit: int = Query(100), user: dict = Depends(current_user)):
+    if user['id'] not in (user1, user2):
+        raise HTTPException(status_code=403, detail="Not a participant of this conversation.")
+    return await run_db(db.get_messages, user1, user2, after_id=after_id, before_id=before_id, limit=limit)
 
 @app.post("/send-message")
-async def send_message_api(data: MessageData):
-    if not db.is_email_verified(data.sender_id):
+async def send_message_api(data: MessageData, user: dict = Depends(current_user)):
+    require_self(user, data.sender_id)
+    if not user.get('is_email_verified'):
         raise HTTPException(status_code=403, detail="Email not verified.")
-    db.send_message(data.sender_id, data.receiver_id, data.content)
+    db.touch_presence(data.sender_id)
+    if db.write_behind:
+        message_id = await asyncio.wrap_future(db.queue_message(data.sender_id, data.receiver_id, data.content))
+        await run_db(db.message_written, message_id, data.sender_id, data.receiver_id)
+    else:
+        await run_db(db.send_message, data.sender_id, data.receiver_id, data.content)
     return {"message": "Sent"}
 
 @app.get("/feed")
-async def get_feed_api(limit: int = 100, after_id: int = Query(0)):
-    return db.get_feed(limit=limit, after_id=after_id)
+async def get_feed_api(limit: int = 100, after_id: int = Query(0), before_id: Optional[int] = Query(None), cursor: Optional[str] = Query(None)):
+    try:
+        return await run_db(db.get_feed_page, limit=limit, after_id=after_id, before_id=before_id, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/news")
-async def get_news_api(limit: int = 100, after_id: int = Query(0)):
-    return db.get_news(limit=limit, after_id=after_id)
+async def get_news_api(limit: int = 100, after_id: int = Query(0), before_id: Optional[int] = Query(None), cursor: Optional[str] = Query(None)):
+    try:
+        return await run_db(db.get_news_page, limit=limit, after_id=after_id, before_id=before_id, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/events/{user_id}")
+async def events_stream(user_id: int, request: Request, user: dict = Depends(current_user)):
+    require_self(user, user_id)
+    return StreamingResponse(
+        hub.stream(user_id, request, on_tick=lambda: db.touch_presence(user_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/channel-feed/{channel_id}")
-async def get_channel_feed_api(channel_id: int, user_id: int):
-    return db.get_feed(limit=100) # Mock for now
+async def get_channel_feed_api(channel_id: int, user_id: Optional[int] = None, limit: int = 50, after_id: int = Query(0), before_id: Optional[int] = Query(None), cursor: Optional[str] = Query(None), user: dict = Depends(current_user)):
+    if user_id is not None:
+        require_self(user, user_id)
+    try:
+        page = await run_db(db.get_channel_feed, channel_id, user['id'], cursor=cursor, limit=limit, after_id=after_id, before_id=before_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Channel not found.")
+    return page
 
 @app.post("/join-channel/{channel_id}")
-async def join_channel(channel_id: int, user_id: int = Form(...)):
+async def join_channel(channel_id: int, user_id: int = Form(...), user: dict = Depends(current_user)):
+    require_self(user, user_id)
+    if not (db.channels.get(channel_id) or await run_db(db.get_channel, channel_id)):
+        raise HTTPException(status_code=404, detail="Channel not found.")
+    await run_db(db.add_channel_member, channel_id, user_id)
     return {"message": "Joined"}
 
+@app.get("/timeline/{user_id}")
+async def get_home_timeline_api(user_id: int, limit: int = 50, after_id: int = Query(0), before_id: Optional[int] = Query(None), cursor: Optional[str] = Query(None), user: dict = Depends(current_user)):
+    require_self(user, user_id)
+    try:
+        return await run_db(db.get_home_timeline, user_id, cursor=cursor, limit=limit, after_id=after_id, before_id=before_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 class PaymentData(BaseModel):
     user_id: int
     item_id: str
@@ -224,83 +395,139 @@ class PaymentConfirmData(BaseModel):
     test_code: str
 
 @app.post("/initiate-payment")
-async def initiate_payment(data: PaymentData):
-    pid = db.initiate_simulated_payment(data.user_id, data.item_id, data.amount)
+async def initiate_payment(data: PaymentData, user: dict = Depends(current_user)):
+    require_self(user, data.user_id)
+    pid = await run_db(db.initiate_simulated_payment, data.user_id, data.item_id, data.amount)
     return {"payment_id": pid}
 
 @app.post("/simulated-payment/confirm")
 async def confirm_payment(data: PaymentConfirmData):
     # In production, this would be a real Transaction ID check
-    pay_info = db.get_simulated_payment(data.payment_id)
+    pay_info = await run_db(db.get_simulated_payment, data.payment_id)
     if pay_info:
         # We'll allow any 4+ char code as a "simulated" success for now
         if len(data.test_code) >= 4:
-            db.complete_simulated_payment(data.payment_id)
-            db.upgrade_user_badge(pay_info['user_id'], pay_info['item_id'])
+            await run_db(db.complete_simulated_payment, data.payment_id)
+            await run_db(db.upgrade_user_badge, pay_info['user_id'], pay_info['item_id'])
             return {"message": "Success"}
     raise HTTPException(status_code=400, detail="Failed")
 
 @app.get("/admin/pending-payments")
-async def get_pending_payments(): return db.get_pending_simulated_payments()
+async def get_pending_payments(): return await run_db(db.get_pending_simulated_payments)
 
 @app.get("/admin/pending-devs")
-async def get_pending_devs(): return db.get_pending_dev_applications()
+async def get_pending_devs(): return await run_db(db.get_pending_dev_applications)
 
 @app.get("/admin/reports")
-async def get_reports(): return db.get_all_reports()
+async def get_reports(): return await run_db(db.get_all_reports)
+
+@app.get("/admin/db-pool")
+async def get_db_pool_stats(): return db.get_pool_stats()
+
+@app.get("/admin/hot-feed")
+async def get_hot_feed_stats(): return db.get_hot_feed_stats()
+
+@app.get("/admin/shell")
+async def get_shell_stats(): return shell.stats()
+
+@app.get("/admin/thumbnails")
+async def get_thumbnail_stats(): return db.thumbnails.stats()
+
+@app.get("/admin/mail-outbox")
+async def get_mail_outbox_stats():
+    return {**await run_db(db.auth_service.outbox.stats), "smtp": db.auth_service.smtp_pool.stats()}
+
+@app.get("/admin/sessions")
+async def get_session_stats(): return db.sessions.stats()
+
+@app.get("/admin/channels")
+async def get_channel_cache_stats(): return db.channels.stats()
+
+@app.get("/admin/fanout")
+async def get_fanout_stats(): return db.get_fanout_stats()
+
+@app.get("/admin/write-behind")
+async def get_write_behind_stats(): return db.get_write_behind_stats()
+
+@app.get("/admin/user-cache")
+async def get_user_cache_stats(): return db.users.stats()
+
+@app.get("/admin/realtime")
+async def get_realtime_stats(): return hub.stats()
+
+@app.get("/admin/loop-stats")
+async def get_loop_stats(reset: bool = False):
+    stats = {"loop": loop_monitor.stats(), "db_executor": db_executor.stats(), "db_pool": db.get_pool_stats()}
+    if reset:
+        loop_monitor.reset()
+        db_executor.reset_stats()
+    return stats
 
 @app.post("/admin/approve-payment/{pid}")
 async def approve_payment_admin(pid: str):
-    pay_info = db.get_simulated_payment(pid)
+    pay_info = await run_db(db.get_simulated_payment, pid)
     if pay_info:
-        db.complete_simulated_payment(pid)
-        db.upgrade_user_badge(pay_info['user_id'], pay_info['item_id'])
+        await run_db(db.complete_simulated_payment, pid)
+        await run_db(db.upgrade_user_badge, pay_info['user_id'], pay_info['item_id'])
     return {"message": "Approved"}
 
 @app.post("/apply-dev")
-async def apply_dev(user_id: int = Form(...), details: str = Form(...), cert_pdf: Optional[UploadFile] = File(None)):
+async def apply_dev(user_id: int = Form(...), details: str = Form(...), cert_pdf: Optional[UploadFile] = File(None), user: dict = Depends(current_user)):
+    require_self(user, user_id)
     pdf_url = None
     if cert_pdf:
-        os.makedirs("uploads/dev_certs", exist_ok=True)
         filename = f"{user_id}_dev_{secrets.token_hex(4)}.pdf"
-        pdf_url = f"uploads/dev_certs/{filename}"
-        with open(pdf_url, "wb") as f: f.write(await cert_pdf.read())
-    db.create_dev_application(user_id, details, pdf_url)
+        pdf_url = await store_upload(cert_pdf, "uploads/dev_certs", filename)
+    await run_db(db.create_dev_application, user_id, details, pdf_url)
     return {"message": "Submitted"}
 
 @app.post("/admin/approve-dev/{app_id}")
 async def approve_dev_admin(app_id: int):
-    db.approve_dev_application(app_id)
+    await run_db(db.approve_dev_application, app_id)
     return {"message": "Approved"}
 
 @app.post("/admin/delete-post/{pid}")
 async def delete_post_admin(pid: int):
-    db.delete_post(pid)
+    await run_db(db.delete_post, pid)
     return {"message": "Deleted"}
 
 @app.post("/admin/mute-user/{username}")
 async def mute_user_admin(username: str):
-    db.mute_user(username)
+    await run_db(db.mute_user, username)
     return {"message": "Muted"}
 
 @app.post("/report-post/{pid}")
-async def report_post_api(pid: int, user_id: int = Form(...)):
-    db.report_post(pid, user_id)
+async def report_post_api(pid: int, user_id: int = Form(...), user: dict = Depends(current_user)):
+    require_self(user, user_id)
+    if db.write_behind:
+        await asyncio.wrap_future(db.queue_report(pid, user_id))
+    else:
+        await run_db(db.report_post, pid, user_id)
     return {"message": "Reported"}
 
 @app.get("/unreads/{user_id}")
-async def get_unreads(user_id: int):
-    return {"wall": 0, "pulse": 0, "nodes": 0, "chats": 0}
+async def get_unreads(user_id: int, user: dict = Depends(current_user)):
+    require_self(user, user_id)
+    db.touch_presence(user_id)
+    return await run_db(db.get_unreads, user_id)
 
 @app.post("/mark-read/{user_id}/{cat}")
-async def mark_read(user_id: int, cat: str):
+async def mark_read(user_id: int, cat: str, channel_id: Optional[int] = Query(None), peer_id: Optional[int] = Query(None), user: dict = Depends(current_user)):
+    require_self(user, user_id)
+    try:
+        await run_db(db.mark_read, user_id, cat, channel_id=channel_id, peer_id=peer_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"status": "ok"}
 
 @app.exception_handler(404)
 async def custom_404(request: Request, exc: HTTPException):
     if request.url.path.startswith("/api") or request.url.path.startswith("/uploads"):
         return JSONResponse(status_code=404, content={"detail": "Not Found"})
-    return FileResponse("billboard.html")
+    if exc.detail != "Not Found":
+        # Raised by a handler (unknown user, channel...), not an unmatched path
+        return JSONResponse(status_code=404, content={"detail": exc.detail})
+    return shell.response(request)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8006)
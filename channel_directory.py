@@ -0,0 +1,111 @@
+import hashlib
+import json
+import threading
+import time
+
+
+class ChannelDirectory:
+    """In-process copy of the channels table: id map, owner index and /get-channels body.
+
+    `loader` returns every channel row in display order. The directory
+    reloads on first use, after invalidate() (create_channel calls it), and
+    once the snapshot is older than `ttl` seconds, which bounds staleness
+    for channels created by another process. The JSON body and its ETag are
+    built once per load, so an unchanged /get-channels costs a dict lookup
+    and usually ends in a 304.
+    """
+
+    def __init__(self, loader, ttl=60.0):
+        self._loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_owner = {}
+        self._rows = []
+        self._body = b"[]"
+        self._etag = None
+        self._loaded_at = None
+        self._large = (None, None, frozenset())  # (loads, member_limit, ids)
+        self.loads = 0
+        self.hits = 0
+        self.misses = 0
+
+    def is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def reload(self):
+        rows = [dict(r) for r in self._loader()]
+        body = json.dumps(rows, default=str).encode()
+        by_owner = {}
+        for row in rows:
+            by_owner.setdefault(row["owner_id"], []).append(row["id"])
+        with self._lock:
+            self._rows = rows
+            self._by_id = {row["id"]: row for row in rows}
+            self._by_owner = by_owner
+            self._body = body
+            self._etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _fresh(self):
+        if self.is_stale():
+            self.reload()
+
+    def get(self, channel_id):
+        """The channel row, or None if it is unknown or the snapshot is stale (no DB access)."""
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                self.misses += 1
+                return None
+            row = self._by_id.get(channel_id)
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(row)
+
+    def lookup(self, channel_id):
+        self._fresh()
+        return self.get(channel_id)
+
+    def all(self):
+        self._fresh()
+        with self._lock:
+            return [dict(r) for r in self._rows]
+
+    def owned_by(self, owner_id):
+        self._fresh()
+        with self._lock:
+            return [dict(self._by_id[cid]) for cid in self._by_owner.get(owner_id, ())]
+
+    def larger_than(self, member_limit):
+        """Ids of channels with more than `member_limit` members, as of the current snapshot."""
+        self._fresh()
+        with self._lock:
+            loads, limit, ids = self._large
+            if loads != self.loads or limit != member_limit:
+                ids = frozenset(cid for cid, row in self._by_id.items() if (row.get("member_count") or 0) > member_limit)
+                self._large = (self.loads, member_limit, ids)
+            return ids
+
+    def snapshot(self):
+        """(json body, etag) of the full channel list."""
+        self._fresh()
+        with self._lock:
+            return self._body, self._etag
+
+    def stats(self):
+        with self._lock:
+            return {
+                "channels": len(self._rows),
+                "owners": len(self._by_owner),
+                "loads": self.loads,
+                "hits": self.hits,
+                "misses": self.misses,
+                "age": time.monotonic() - self._loaded_at if self._loaded_at is not None else None,
+            }
@@ -0,0 +1,141 @@
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DBExecutor:
+    """Runs blocking BillboardManager calls off the event loop.
+
+    mode="threadpool" (default) dispatches every call to a bounded thread pool;
+    mode="inline" runs it directly on the loop, which is the old behaviour and
+    only useful as a baseline when comparing loop-lag numbers.
+    """
+
+    MODES = ("threadpool", "inline")
+
+    def __init__(self, max_workers=10, mode="threadpool"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown DB execution mode: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db") if mode == "threadpool" else None
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._in_flight = 0
+        self._exec_time = 0.0
+        self._queue_wait = 0.0
+        self._max_queue_wait = 0.0
+        self._inline_block = 0.0
+
+    def _timed(self, submitted_at, fn, args, kwargs):
+        started = time.perf_counter()
+        waited = started - submitted_at
+        with self._lock:
+            self._in_flight += 1
+            self._queue_wait += waited
+            self._max_queue_wait = max(self._max_queue_wait, waited)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._in_flight -= 1
+                self._calls += 1
+                self._exec_time += elapsed
+                if self._executor is None:
+                    self._inline_block += elapsed
+
+    async def run(self, fn, *args, **kwargs):
+        if self._executor is None:
+            return self._timed(time.perf_counter(), fn, args, kwargs)
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self._timed, time.perf_counter(), fn, args, kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "max_workers": self.max_workers if self._executor else 0,
+                "calls": self._calls,
+                "in_flight": self._in_flight,
+                "total_exec_seconds": round(self._exec_time, 6),
+                "total_queue_wait_seconds": round(self._queue_wait, 6),
+                "max_queue_wait_ms": round(self._max_queue_wait * 1000, 3),
+                "inline_block_seconds": round(self._inline_block, 6),
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._calls = 0
+            self._exec_time = self._queue_wait = self._max_queue_wait = self._inline_block = 0.0
+
+
+class LoopLagMonitor:
+    """Measures how long the event loop is blocked.
+
+    Sleeps for `interval` seconds in a loop and records how late each wake-up
+    was. A responsive loop stays near 0 ms; a blocking DB call on the loop
+    shows up directly as lag.
+    """
+
+    def __init__(self, interval=0.05, window=2000):
+        self.interval = interval
+        self._samples = deque(maxlen=window)
+        self._task = None
+        self._ticks = 0
+        self._total_lag = 0.0
+        self._max_lag = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._ticks += 1
+            self._total_lag += lag
+            self._max_lag = max(self._max_lag, lag)
+            self._samples.append(lag)
+
+    def stats(self):
+        samples = sorted(self._samples)
+
+        def pct(p):
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3)
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "ticks": self._ticks,
+            "total_blocked_seconds": round(self._total_lag, 6),
+            "max_lag_ms": round(self._max_lag * 1000, 3),
+            "p50_lag_ms": pct(0.50),
+            "p99_lag_ms": pct(0.99),
+        }
+
+    def reset(self):
+        self._samples.clear()
+        self._ticks = 0
+        self._total_lag = self._max_lag = 0.0
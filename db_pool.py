@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """Thin proxy around a DB-API connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise AttributeError(f"Connection already returned to pool (accessing {name!r})")
+        return getattr(conn, name)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def discard(self):
+        """Drops the underlying connection instead of recycling it (e.g. after a fatal error)."""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn, discard=True)
+
+    def __del__(self):
+        # Safety net for code paths that raise before reaching conn.close()
+        if self.__dict__.get("_conn") is not None:
+            self.close()
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections with health checks on checkout.
+
+    `connect` is a zero-argument callable returning a fresh raw connection.
+    Connections idle for longer than `health_check_interval` seconds are pinged
+    with `SELECT 1` before being handed out; broken ones are replaced.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=30.0,
+                 health_check_interval=5.0, max_idle_time=300.0, name="db"):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._connect = connect
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_idle_time = max_idle_time
+        self.name = name
+
+        self._idle = deque()  # (conn, last_used) pairs, most recently used on the right
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._counters = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "failed_health_checks": 0,
+        }
+        self._wait_time = 0.0
+        self._closed = False
+
+        for _ in range(self.min_size):
+            conn = self._new_connection()
+            self._idle.append((conn, time.monotonic()))
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._cond:
+            self._counters["created"] += 1
+        return conn
+
+    def _close_raw(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._counters["closed"] += 1
+
+    def _is_healthy(self, conn, last_used):
+        if getattr(conn, "closed", 0):
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        if self._closed:
+            raise PoolTimeout(f"[{self.name} pool] Pool is closed")
+        deadline = time.monotonic() + self.timeout
+        conn, last_used = None, None
+        with self._cond:
+            waited_from = None
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if len(self._idle) + self._in_use < self.max_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolTimeout(f"[{self.name} pool] No connection available after {self.timeout}s")
+                if waited_from is None:
+                    waited_from = time.monotonic()
+                    self._counters["waits"] += 1
+                self._cond.wait(remaining)
+            if waited_from is not None:
+                self._wait_time += time.monotonic() - waited_from
+            self._in_use += 1
+            self._counters["checkouts"] += 1
+
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                with self._cond:
+                    self._counters["failed_health_checks"] += 1
+                self._close_raw(conn)
+                conn = None
+            if conn is None:
+                conn = self._new_connection()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, conn)
+
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                # Never hand out a connection with a half-finished transaction
+                conn.rollback()
+            except Exception:
+                discard = True
+        if discard or self._closed or getattr(conn, "closed", 0):
+            self._close_raw(conn)
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            return
+
+        now = time.monotonic()
+        stale = []
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((conn, now))
+            # Shrink back towards min_size once connections have sat idle long enough
+            while len(self._idle) > self.min_size and now - self._idle[0][1] > self.max_idle_time:
+                stale.append(self._idle.popleft()[0])
+            self._cond.notify()
+        for old in stale:
+            self._close_raw(old)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_raw(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "name": self.name,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": len(self._idle) + self._in_use,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "total_wait_seconds": round(self._wait_time, 6),
+                **self._counters,
+            }
@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+
+
+class FanoutQueue:
+    """Background fan-out-on-write for the push home timeline.
+
+    create_post calls submit(channel_id, post_id) after its commit and
+    returns. A worker thread reads the channel's members with
+    `members(channel_id)` and passes (user_id, post_id) rows to
+    `write(rows)`, which inserts them in one transaction and must ignore
+    rows that already exist. Jobs queued together are coalesced, and rows are
+    written in chunks of `batch_size`, so a post to a 10k-member channel costs
+    20 executemany round trips, not 10k single inserts and not one giant
+    transaction holding the write lock.
+
+    A new post reaches inboxes after the queue lag that stats() reports
+    (usually milliseconds). A failing member lookup or chunk (e.g. "database
+    is locked") is retried `retries` times with exponential backoff starting
+    at `backoff` seconds, which is safe because writes are idempotent. Once
+    every row of a pass is written, `done(post_ids)` is called. The caller
+    keeps each job in durable storage until then, so jobs that were still
+    queued at a crash, or that kept failing, can be resubmitted on startup.
+    """
+
+    def __init__(self, members, write, batch_size=500, done=None, retries=5, backoff=0.05):
+        self.members = members
+        self.write = write
+        self.batch_size = batch_size
+        self.done = done
+        self.retries = retries
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._outstanding = 0
+        self._thread = None
+        self.posts = 0
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.retried = 0
+        self.busy_seconds = 0.0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self):
+        # Under the lock: concurrent submitters must not start a second worker
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="timeline-fanout", daemon=True)
+                self._thread.start()
+
+    def submit(self, channel_id, post_id):
+        with self._lock:
+            self._outstanding += 1
+        self._queue.put((channel_id, post_id, time.monotonic()))
+        self.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            jobs = [job]
+            # Coalesce posts that are already waiting (at most batch_size of them) into one pass
+            while len(jobs) < self.batch_size:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._queue.put(None)
+                    break
+                jobs.append(job)
+            self._fan_out(jobs)
+
+    def _retrying(self, fn, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return fn(*args)
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                with self._lock:
+                    self.retried += 1
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _fan_out(self, jobs):
+        started = time.monotonic()
+        rows = []
+        written = batches = 0
+        try:
+            for channel_id, post_id, _ in jobs:
+                rows.extend((user_id, post_id) for user_id in self._retrying(self.members, channel_id))
+            for i in range(0, len(rows), self.batch_size):
+                self._retrying(self.write, rows[i:i + self.batch_size])
+                written += len(rows[i:i + self.batch_size])
+                batches += 1
+            if self.done:
+                self._retrying(self.done, [post_id for _, post_id, _ in jobs])
+        except Exception as e:
+            print(f"[Fanout Error] {len(jobs)} post(s), {written}/{len(rows)} rows written, left for the next startup: {e}")
+            failed = True
+        else:
+            failed = False
+        finished = time.monotonic()
+        with self._lock:
+            self.posts += len(jobs)
+            self.rows += written
+            self.batches += batches
+            self.errors += failed
+            self.busy_seconds += finished - started
+            for _, _, queued_at in jobs:
+                self.total_lag += finished - queued_at
+                self.max_lag = max(self.max_lag, finished - queued_at)
+            self._outstanding -= len(jobs)
+            if not self._outstanding:
+                self._idle.notify_all()
+
+    def drain(self, timeout=None):
+        """Waits until every submitted post has been fanned out; False on timeout."""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._outstanding, timeout)
+
+    def close(self, timeout=5.0):
+        self.drain(timeout)
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            busy = self.busy_seconds
+            return {
+                "queued": self._outstanding,
+                "posts": self.posts,
+                "rows": self.rows,
+                "batches": self.batches,
+                "errors": self.errors,
+                "retried": self.retried,
+                "busy_seconds": round(busy, 3),
+                # Worker throughput while busy, i.e. the sustainable write rate
+                "posts_per_sec": round(self.posts / busy, 1) if busy else None,
+                "rows_per_sec": round(self.rows / busy, 1) if busy else None,
+                "avg_lag_ms": round(1000 * self.total_lag / self.posts, 2) if self.posts else None,
+                "max_lag_ms": round(1000 * self.max_lag, 2),
+            }
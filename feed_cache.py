@@ -0,0 +1,224 @@
+import bisect
+import threading
+from collections import OrderedDict
+
+
+class HotFeed:
+    """Process-local window of the newest live posts of one timeline.
+
+    Rows are stored exactly as get_feed/get_news return them (post columns
+    joined with username, badge_type and user_avatar), ordered by id. The
+    window is complete above `floor`: every live post with id > floor is in
+    it, which is what lets page() answer after_id polls without the database.
+    Posts still between their INSERT and add() are the exception; readers go
+    through InFlightIds.page(), which passes the lowest such id as `ceiling`,
+    so a poll never hands out a cursor that skips one.
+
+    Writes made by another process are not seen here, so this assumes a
+    single uvicorn worker (or sticky routing) like the rest of the app.
+    """
+
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self._ids = []
+        self._rows = []
+        self._floor = None  # None until load() has run
+        self._pending = []  # rows added before load(); merged in by it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, rows):
+        """Seeds the window from the newest `capacity` rows, newest first."""
+        rows = sorted(rows, key=lambda r: r["id"])[-self.capacity:]
+        with self._lock:
+            self._rows = rows
+            self._ids = [r["id"] for r in rows]
+            # A short result means there are no older live posts at all
+            self._floor = rows[0]["id"] - 1 if len(rows) >= self.capacity else 0
+            # Posts committed while the loading query ran may be missing from `rows`
+            pending, self._pending = self._pending, []
+            for row in pending:
+                self._add(row)
+
+    def add(self, row):
+        with self._lock:
+            if self._floor is None:
+                self._pending = (self._pending + [row])[-self.capacity:]
+                return
+            self._add(row)
+
+    def _add(self, row):
+        if row["id"] <= self._floor:
+            return
+        i = bisect.bisect_left(self._ids, row["id"])
+        if i < len(self._ids) and self._ids[i] == row["id"]:
+            self._rows[i] = row
+            return
+        self._ids.insert(i, row["id"])
+        self._rows.insert(i, row)
+        while len(self._ids) > self.capacity:
+            self._floor = self._ids.pop(0)
+            self._rows.pop(0)
+
+    def remove(self, post_id):
+        with self._lock:
+            self._pending = [r for r in self._pending if r["id"] != post_id]
+            i = bisect.bisect_left(self._ids, post_id)
+            if i < len(self._ids) and self._ids[i] == post_id:
+                del self._ids[i]
+                del self._rows[i]
+
+    def update_author(self, user_id, fields):
+        with self._lock:
+            # Replace rather than mutate: rows may be mid-serialization elsewhere
+            self._rows = [dict(r, **fields) if r["user_id"] == user_id else r for r in self._rows]
+
+    def page(self, limit, after_id=0, before_id=None, ceiling=None):
+        """Newest-first page matching BillboardManager._get_posts_page, or None if not covered.
+
+        Only rows with id < ceiling are returned when a ceiling is given.
+        """
+        with self._lock:
+            result = self._page(limit, after_id, before_id, ceiling)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def _page(self, limit, after_id, before_id, ceiling):
+        if self._floor is None:
+            return None
+        top = len(self._ids) if ceiling is None else bisect.bisect_left(self._ids, ceiling)
+        if before_id:
+            end = min(bisect.bisect_left(self._ids, before_id), top)
+            if end < limit and self._floor > 0:
+                return None
+            return self._rows[max(0, end - limit):end][::-1]
+        if after_id:
+            if after_id < self._floor:
+                return None
+            start = bisect.bisect_right(self._ids, after_id)
+            return self._rows[start:min(start + limit, top)][::-1]
+        if top < limit and self._floor > 0:
+            return None
+        return self._rows[max(0, top - limit):top][::-1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "size": len(self._ids),
+                "floor_id": self._floor,
+                "newest_id": self._ids[-1] if self._ids else None,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class InFlightIds:
+    """Ids of posts that may be committed but are not yet in their hot feed.
+
+    create_post registers an id inside its insert transaction, before the
+    commit, and calls land() once the row is known (or discard() if the
+    write failed). Concurrent posts are committed and added in any order, so
+    until the lowest such id lands, a feed page is only known to be complete
+    below it. land() and page() share one lock, so a reader never sees a
+    feed that already holds a row and has also lost track of an id below it.
+    """
+
+    def __init__(self):
+        self._ids = set()
+        self._lock = threading.Lock()
+
+    def add(self, post_id):
+        with self._lock:
+            self._ids.add(post_id)
+
+    def land(self, post_id, feed=None, row=None):
+        """Adds the row to its feed (if any) and stops holding readers back for it."""
+        with self._lock:
+            if feed is not None and row is not None:
+                feed.add(row)
+            self._ids.discard(post_id)
+
+    def discard(self, post_id):
+        self.land(post_id)
+
+    def page(self, feed, limit, after_id=0, before_id=None):
+        with self._lock:
+            return feed.page(limit, after_id, before_id, min(self._ids) if self._ids else None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids)
+
+
+class HotFeedSet:
+    """HotFeeds keyed by channel id, created and loaded on first read, LRU-bounded.
+
+    `loader(key, limit)` returns the newest `limit` live posts of one
+    channel. A feed is registered before its load query runs, so posts
+    created meanwhile are buffered by HotFeed.add and merged in by load().
+    """
+
+    def __init__(self, loader, capacity=50, max_feeds=256):
+        self._loader = loader
+        self.capacity = capacity
+        self.max_feeds = max_feeds
+        self._feeds = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            feed = self._feeds.get(key)
+            if feed is not None:
+                self._feeds.move_to_end(key)
+                return feed
+            feed = HotFeed(self.capacity)
+            self._feeds[key] = feed
+            while len(self._feeds) > self.max_feeds:
+                self._feeds.popitem(last=False)
+                self.evictions += 1
+        try:
+            feed.load(self._loader(key, self.capacity))
+        except Exception:
+            with self._lock:
+                if self._feeds.get(key) is feed:
+                    del self._feeds[key]
+            raise
+        self.loads += 1
+        return feed
+
+    def peek(self, key):
+        """The feed for `key` if one is cached; writes only update feeds that exist."""
+        with self._lock:
+            return self._feeds.get(key)
+
+    def remove(self, post_id):
+        with self._lock:
+            feeds = list(self._feeds.values())
+        for feed in feeds:
+            feed.remove(post_id)
+
+    def update_author(self, user_id, fields):
+        with self._lock:
+            feeds = list(self._feeds.values())
+        for feed in feeds:
+            feed.update_author(user_id, fields)
+
+    def stats(self):
+        with self._lock:
+            feeds = list(self._feeds.values())
+        return {
+            "feeds": len(feeds),
+            "max_feeds": self.max_feeds,
+            "capacity": self.capacity,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "hits": sum(f.hits for f in feeds),
+            "misses": sum(f.misses for f in feeds),
+        }
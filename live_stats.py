@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class PresenceTracker:
+    """Users seen within the last `ttl` seconds count as online."""
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def touch(self, user_id):
+        if user_id is None:
+            return
+        with self._lock:
+            self._seen[user_id] = time.monotonic()
+
+    def count(self):
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [uid for uid, seen in self._seen.items() if seen < cutoff]
+            for uid in expired:
+                del self._seen[uid]
+            return len(self._seen)
+
+
+class LiveStats:
+    """Dashboard totals kept in memory and adjusted on the write paths.
+
+    `loader` is a callable returning the authoritative counts (one COUNT
+    query per total). It runs on first use and again once the snapshot is
+    older than `resync_interval` seconds. Increments from this process are
+    visible immediately; writes from other processes, and increments racing
+    a resync, are corrected by the next resync. So /status is never more
+    than `resync_interval` seconds stale.
+    """
+
+    def __init__(self, loader, resync_interval=300.0):
+        self._loader = loader
+        self.resync_interval = resync_interval
+        self._counts = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+        self.resyncs = 0
+
+    def is_stale(self):
+        return self._counts is None or time.monotonic() - self._synced_at > self.resync_interval
+
+    def resync(self):
+        counts = dict(self._loader())
+        with self._lock:
+            self._counts = counts
+            self._synced_at = time.monotonic()
+            self.resyncs += 1
+
+    def incr(self, name, delta=1):
+        with self._lock:
+            if self._counts is not None:
+                self._counts[name] = self._counts.get(name, 0) + delta
+
+    def get(self, name):
+        if self.is_stale():
+            self.resync()
+        with self._lock:
+            return self._counts.get(name, 0)
+
+    def age(self):
+        return time.monotonic() - self._synced_at if self._counts is not None else None
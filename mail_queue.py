@@ -0,0 +1,161 @@
+import random
+import sqlite3
+import threading
+import time
+
+
+class MailOutbox:
+    """Disk-backed outbound email queue with a background sender thread.
+
+    enqueue() only writes a row to a small SQLite file and returns, so no
+    request ever waits on SMTP. The worker thread delivers due messages
+    oldest first through `send(recipient, subject, body)`, which must raise
+    on failure. Failures are retried with exponential backoff and jitter;
+    after `max_attempts` the message is marked failed and kept for
+    inspection. The queue survives restarts, and delivery is at-least-once:
+    a crash between a successful send and the row update resends that one
+    message.
+    """
+
+    def __init__(self, path, send, max_attempts=8, retry_base=30.0, retry_max=3600.0, batch_size=50):
+        self.path = path
+        self.send = send
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY,
+                recipient TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL
+            )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+        self._db_lock = threading.Lock()
+        self._send_lock = threading.Lock()  # one delivery pass at a time (worker or drain)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        if self.pending():
+            # Resume messages left over from the previous run
+            self.start()
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="mail-outbox", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def enqueue(self, recipient, subject, body):
+        now = time.time()
+        self._execute(
+            "INSERT INTO outbox (recipient, subject, body, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+            (recipient, subject, body, now, now),
+        )
+        self.start()
+        self._wakeup.set()
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.deliver_due()
+            except Exception as e:
+                print(f"[Outbox Error] {e}")
+            self._wakeup.clear()
+            self._wakeup.wait(self._seconds_until_next_due())
+
+    def _seconds_until_next_due(self):
+        rows = self._execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'")
+        if not rows or rows[0][0] is None:
+            return None
+        return max(0.0, rows[0][0] - time.time())
+
+    def deliver_due(self, now=None):
+        """Sends every message that is due; returns how many were delivered."""
+        delivered = 0
+        last_id = 0
+        with self._send_lock:
+            # One pass in id order, so a message that fails is not retried within the same pass
+            while True:
+                rows = self._execute(
+                    "SELECT id, recipient, subject, body, attempts FROM outbox "
+                    "WHERE status = 'pending' AND next_attempt_at <= ? AND id > ? ORDER BY id LIMIT ?",
+                    (time.time() if now is None else now, last_id, self.batch_size),
+                )
+                if not rows:
+                    return delivered
+                last_id = rows[-1][0]
+                for msg_id, recipient, subject, body, attempts in rows:
+                    if self._stop.is_set() and now is None:
+                        return delivered
+                    try:
+                        self.send(recipient, subject, body)
+                    except Exception as e:
+                        self._record_failure(msg_id, attempts + 1, e)
+                        continue
+                    self._execute("UPDATE outbox SET status = 'sent', attempts = ?, sent_at = ?, last_error = NULL WHERE id = ?", (attempts + 1, time.time(), msg_id))
+                    self.sent += 1
+                    delivered += 1
+
+    def _record_failure(self, msg_id, attempts, error):
+        if attempts >= self.max_attempts:
+            self._execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?", (attempts, str(error), msg_id))
+            self.failed += 1
+            print(f"[Outbox] Giving up on message {msg_id} after {attempts} attempts: {error}")
+            return
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+        self._execute("UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?", (attempts, time.time() + delay, str(error), msg_id))
+        self.retried += 1
+
+    def drain(self, timeout=10.0):
+        """Delivers everything pending until the queue is empty or `timeout` passes.
+
+        The first pass tries every pending message regardless of its backoff;
+        after that retries follow the normal schedule. Meant for tests and
+        graceful shutdown. Returns the number of messages still pending.
+        """
+        deadline = time.monotonic() + timeout
+        self.deliver_due(now=float("inf"))
+        while self.pending() and time.monotonic() < deadline:
+            wait = self._seconds_until_next_due() or 0.0
+            time.sleep(min(wait, max(0.0, deadline - time.monotonic())))
+            self.deliver_due()
+        return self.pending()
+
+    def pending(self):
+        return self._execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'")[0][0]
+
+    def stats(self):
+        counts = dict(self._execute("SELECT status, COUNT(*) FROM outbox GROUP BY status"))
+        return {
+            "pending": counts.get("pending", 0),
+            "sent_total": counts.get("sent", 0),
+            "failed_total": counts.get("failed", 0),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
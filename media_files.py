@@ -0,0 +1,69 @@
+import hashlib
+import os
+import re
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Legacy uploads keep their name if the file is replaced, so clients must revalidate
+MUTABLE_CACHE_CONTROL = os.environ.get("UPLOADS_CACHE_CONTROL", "public, max-age=0, must-revalidate")
+
+# <sha256>[.w<width>][.ext]; resized variants are derived from the content, so just as immutable
+_CAS_NAME = re.compile(r"^[0-9a-f]{64}(\.w[0-9]+)?(\.[A-Za-z0-9]+)?$")
+
+
+class MediaFiles(StaticFiles):
+    """Serves /uploads with validators and caching tuned for media.
+
+    - Content-addressed files (uploads/cas/...) use their SHA-256 as a
+      strong ETag and are marked immutable, so browsers keep them for a
+      year without asking again. A revalidation whose If-None-Match names
+      the hash gets a 304 without touching the disk at all.
+    - Other uploads get a strong ETag from inode, size and mtime (they are
+      only ever replaced atomically) and must be revalidated.
+    - Byte ranges (video seeking) and If-Range come from FileResponse, which
+      also hands the file to the server via the ASGI pathsend extension
+      (sendfile) when the server supports it, and streams it otherwise.
+    - Dotfiles such as the CAS staging directory and in-flight .part files
+      are never served.
+    """
+
+    def __init__(self, directory, cas_prefix="cas"):
+        super().__init__(directory=directory)
+        self.cas_prefix = cas_prefix
+
+    def cas_digest(self, path):
+        parts = path.split(os.sep)
+        match = _CAS_NAME.match(parts[3]) if len(parts) == 4 and parts[0] == self.cas_prefix else None
+        if match:
+            # The hash plus the variant suffix, so each rendition has its own validator
+            return parts[3][:64] + (match.group(1) or "")
+        return None
+
+    async def get_response(self, path, scope):
+        if any(part.startswith(".") for part in path.split(os.sep) if part not in ("", ".")):
+            raise HTTPException(status_code=404)
+        digest = self.cas_digest(path)
+        if digest and scope["method"] in ("GET", "HEAD"):
+            if_none_match = Headers(scope=scope).get("if-none-match", "")
+            if f'"{digest}"' in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+                return NotModifiedResponse(Headers({"etag": f'"{digest}"', "cache-control": IMMUTABLE_CACHE_CONTROL}))
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        digest = self.cas_digest(os.path.relpath(full_path, self.directory))
+        if digest:
+            headers = {"etag": f'"{digest}"', "cache-control": IMMUTABLE_CACHE_CONTROL}
+        else:
+            tag = f"{stat_result.st_ino}-{stat_result.st_size}-{stat_result.st_mtime_ns}"
+            headers = {
+                "etag": f'"{hashlib.md5(tag.encode(), usedforsecurity=False).hexdigest()}"',
+                "cache-control": MUTABLE_CACHE_CONTROL,
+            }
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import os
+import secrets
+import time
+
+from uploads import save_upload
+
+
+class MediaStore:
+    """Content-addressed storage for post media and avatars.
+
+    Files are named by the SHA-256 of their bytes, computed while the upload
+    streams, and sharded two levels deep:
+
+        uploads/cas/ab/cd/abcd...ef.jpg
+
+    Identical uploads therefore share one file and one immutable URL.
+    Reference counting lives in BillboardManager (media_refs); this class
+    only deals with the filesystem. Garbage collection claims a file by
+    renaming it to a tombstone (claim) and then either deletes or restores
+    it (restore), so it never unlinks a path an upload has just written.
+    """
+
+    def __init__(self, root="uploads", prefix="cas"):
+        self.root = root
+        self.prefix = prefix
+        self.base = os.path.join(root, prefix)
+        self.staging = os.path.join(self.base, ".staging")
+        os.makedirs(self.staging, exist_ok=True)
+
+    def relative_path(self, digest, ext):
+        return f"{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+    def url_for(self, digest, ext):
+        return f"{self.root}/{self.relative_path(digest, ext)}"
+
+    def is_managed(self, url):
+        return bool(url) and url.startswith(f"{self.root}/{self.prefix}/")
+
+    def path_for_url(self, url):
+        # URLs are stored relative to the working directory, e.g. "uploads/cas/ab/cd/<hash>.png"
+        return os.path.normpath(url)
+
+    async def store(self, upload, ext, max_bytes=None):
+        """Streams an upload into the store and returns its content-addressed URL."""
+        hasher = hashlib.sha256()
+        staging_path = os.path.join(self.staging, secrets.token_hex(8))
+        await save_upload(upload, staging_path, max_bytes=max_bytes, on_chunk=hasher.update)
+        digest = hasher.hexdigest()
+        await asyncio.to_thread(self._place, staging_path, digest, ext)
+        return self.url_for(digest, ext)
+
+    def _place(self, staging_path, digest, ext):
+        final_path = os.path.join(self.base, digest[:2], digest[2:4], f"{digest}{ext}")
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # Always renamed in, even over an identical file: the path then exists with
+        # a fresh mtime whatever a concurrent garbage sweep did to the old one
+        os.replace(staging_path, final_path)
+
+    def recently_touched(self, url, grace):
+        try:
+            return time.time() - os.path.getmtime(self.path_for_url(url)) < grace
+        except FileNotFoundError:
+            return False
+
+    def claim(self, url):
+        """Renames a file to its tombstone; returns the tombstone path, or None if it is gone."""
+        path = self.path_for_url(url)
+        tombstone = f"{path}.{secrets.token_hex(4)}.gc"
+        try:
+            os.rename(path, tombstone)
+            return tombstone
+        except FileNotFoundError:
+            return None
+
+    def restore(self, url, tombstone):
+        # Replaces any copy stored since the claim; same hash, same bytes
+        os.replace(tombstone, self.path_for_url(url))
+
+    def delete(self, url):
+        if not self.is_managed(url):
+            return False
+        try:
+            os.unlink(self.path_for_url(url))
+            return True
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,92 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEME = "scrypt"
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def is_legacy_hash(stored):
+    """The original format: unsalted hex SHA-256."""
+    return isinstance(stored, str) and len(stored) == 64 and all(c in "0123456789abcdef" for c in stored)
+
+
+class PasswordHasher:
+    """scrypt password hashing with the cost stored in every hash.
+
+    Hashes look like
+
+        scrypt$ln=14,r=8,p=1$<salt>$<key>
+
+    so the cost (n = 2**ln, block size r, parallelism p) can be raised later
+    without invalidating existing passwords: verify() reports when a hash
+    was made with other parameters, or is a legacy SHA-256 hex digest, and
+    the caller stores a fresh hash after a successful login.
+
+    scrypt releases the GIL, so the async variants run it on a dedicated
+    thread pool: logins use every core without stalling the event loop or
+    occupying the DB threads.
+    """
+
+    def __init__(self, ln=14, r=8, p=1, workers=None):
+        self.ln = ln
+        self.r = r
+        self.p = p
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="kdf")
+        # Verified against when the user does not exist, so both cases cost the same
+        self._dummy = self.hash(secrets.token_hex(8))
+
+    @property
+    def params(self):
+        return f"ln={self.ln},r={self.r},p={self.p}"
+
+    def _derive(self, password, salt, ln, r, p):
+        n = 1 << ln
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=2 * 128 * r * n * p + (1 << 20), dklen=KEY_BYTES)
+
+    def hash(self, password):
+        salt = secrets.token_bytes(SALT_BYTES)
+        key = self._derive(password, salt, self.ln, self.r, self.p)
+        return f"{SCHEME}${self.params}${_b64(salt)}${_b64(key)}"
+
+    def verify(self, password, stored):
+        """Returns (matches, needs_rehash)."""
+        if not stored:
+            self.verify(password, self._dummy)
+            return False, False
+        if is_legacy_hash(stored):
+            ok = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+            return ok, ok
+        try:
+            scheme, params, salt, key = stored.split("$")
+            values = dict(item.split("=") for item in params.split(","))
+            ln, r, p = int(values["ln"]), int(values["r"]), int(values["p"])
+        except (ValueError, KeyError):
+            return False, False
+        if scheme != SCHEME:
+            return False, False
+        ok = hmac.compare_digest(self._derive(password, _unb64(salt), ln, r, p), _unb64(key))
+        return ok, ok and params != self.params
+
+    async def hash_async(self, password):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.hash, password)
+
+    async def verify_async(self, password, stored):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.verify, password, stored)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import threading
+
+
+class EventHub:
+    """Fans BillboardManager events out to connected Server-Sent Events clients.
+
+    publish() is safe to call from the DB worker threads; delivery always
+    happens on the event loop bound at startup. Each connection gets a bounded
+    queue. If a slow client falls behind, its backlog is dropped and it gets a
+    single "resync" event telling it to refetch over HTTP.
+    """
+
+    def __init__(self, queue_size=256, keepalive=15.0):
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self._loop = None
+        self._subscribers = {}  # user_id -> set of asyncio.Queue
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.resyncs = 0
+
+    def bind(self, loop):
+        self._loop = loop
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def is_connected(self, user_id):
+        with self._lock:
+            return user_id in self._subscribers
+
+    def publish(self, event, data, user_ids=None):
+        """Queues `event` for the given users, or for everyone when user_ids is None.
+
+        user_ids may be a callable; it is given the connected user ids and
+        returns the ones to deliver to, and is skipped when nobody is connected.
+        """
+        if self._loop is None or self._loop.is_closed():
+            return
+        if callable(user_ids):
+            with self._lock:
+                connected = list(self._subscribers)
+            if not connected:
+                return
+            user_ids = user_ids(connected)
+        self.published += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._deliver(event, data, user_ids)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, event, data, user_ids)
+
+    def _deliver(self, event, data, user_ids):
+        with self._lock:
+            if user_ids is None:
+                targets = [q for qs in self._subscribers.values() for q in qs]
+            else:
+                targets = [q for uid in set(user_ids) for q in self._subscribers.get(uid, ())]
+        for queue in targets:
+            try:
+                queue.put_nowait((event, data))
+                self.delivered += 1
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("resync", {}))
+                self.resyncs += 1
+
+    async def stream(self, user_id, request, on_tick=None):
+        """Async generator of SSE frames for one connection; cleans up on disconnect.
+
+        on_tick, if given, is called on connect and then after every event or
+        keepalive while the client stays connected.
+        """
+        queue = self.subscribe(user_id)
+        try:
+            yield "retry: 3000\n\n"
+            yield format_sse("hello", {"user_id": user_id})
+            while True:
+                if on_tick:
+                    on_tick()
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            self.unsubscribe(user_id, queue)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users_connected": len(self._subscribers),
+                "connections": sum(len(qs) for qs in self._subscribers.values()),
+                "published": self.published,
+                "delivered": self.delivered,
+                "resyncs": self.resyncs,
+            }
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,149 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from user_cache import InvalidationLog
+
+# Columns never handed to clients, in login responses or profile lookups
+PRIVATE_USER_FIELDS = ("password", "verification_code")
+
+
+def new_token():
+    return secrets.token_urlsafe(32)
+
+
+def hash_token(token):
+    # Only the hash is stored, so a leaked sessions table holds no usable tokens
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def public_user(user):
+    return {k: v for k, v in user.items() if k not in PRIVATE_USER_FIELDS} if user else None
+
+
+class SessionCache:
+    """LRU cache of resolved sessions: token hash -> the signed-in user's row.
+
+    An entry is served for at most `ttl` seconds, and never past the
+    session's own expiry. It is then re-read from the sessions table, which
+    also picks up revocations made by another process. Changes to a user
+    (badge, mute, verification, profile) call invalidate_user() so they apply
+    on that user's next request. As with UserCache, put() takes the mark()
+    from before the query and drops the entry if the user was invalidated or
+    the token discarded in the meantime.
+    """
+
+    def __init__(self, capacity=10000, ttl=300.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token_hash -> (user, session_expires_at, cached_at)
+        self._by_user = {}  # user_id -> set of token hashes
+        self._invalidated = InvalidationLog(capacity)  # keyed by user id and by token hash
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token_hash):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None or entry[1] <= now or now - entry[2] > self.ttl:
+                if entry is not None:
+                    self._remove(token_hash)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token_hash)
+            self.hits += 1
+            return entry[0]
+
+    def mark(self):
+        with self._lock:
+            return self._invalidated.mark()
+
+    def put(self, token_hash, user, expires_at, mark=None):
+        with self._lock:
+            if mark is not None and (self._invalidated.changed_since(user["id"], mark)
+                                     or self._invalidated.changed_since(token_hash, mark)):
+                return
+            self._remove(token_hash)
+            self._entries[token_hash] = (user, expires_at, time.time())
+            self._by_user.setdefault(user["id"], set()).add(token_hash)
+            while len(self._entries) > self.capacity:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, token_hash):
+        with self._lock:
+            self._invalidated.bump(token_hash)
+            self._remove(token_hash)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._invalidated.bump(user_id)
+            for token_hash in list(self._by_user.get(user_id, ())):
+                self._remove(token_hash)
+
+    def _remove(self, token_hash):
+        entry = self._entries.pop(token_hash, None)
+        if entry is not None:
+            hashes = self._by_user.get(entry[0]["id"])
+            if hashes is not None:
+                hashes.discard(token_hash)
+                if not hashes:
+                    del self._by_user[entry[0]["id"]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "size": len(self._entries),
+                "users": len(self._by_user),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class AttemptLimiter:
+    """Counts failed attempts per key (an email address, say) in a fixed window.
+
+    Once a key has `max_attempts` failures it is blocked until `window`
+    seconds after its first failure. A success calls reset(). In-process
+    only, which is enough to make guessing a 7-digit code impractical.
+    """
+
+    def __init__(self, max_attempts=5, window=900.0):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._failures = {}  # key -> (count, first_failure_at)
+        self._lock = threading.Lock()
+        self.blocked = 0
+
+    def is_blocked(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._failures.get(key)
+            if entry is None:
+                return False
+            if now - entry[1] > self.window:
+                del self._failures[key]
+                return False
+            if entry[0] >= self.max_attempts:
+                self.blocked += 1
+                return True
+            return False
+
+    def fail(self, key):
+        now = time.time()
+        with self._lock:
+            if len(self._failures) > 10000:
+                # Forget expired windows so an enumeration run cannot grow this forever
+                self._failures = {k: v for k, v in self._failures.items() if now - v[1] <= self.window}
+            count, first = self._failures.get(key, (0, now))
+            if now - first > self.window:
+                count, first = 0, now
+            self._failures[key] = (count + 1, first)
+
+    def reset(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
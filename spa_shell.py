@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+SHELL_CACHE_CONTROL = "no-cache"
+
+
+def accepted_encodings(header):
+    """Returns the set of content codings the client accepts (q > 0)."""
+    accepted = set()
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+class SpaShell:
+    """The single-page app shell, kept in memory with precompressed variants.
+
+    The file is read once and re-read only when its mtime or size changes;
+    the check is a stat at most every `check_interval` seconds. Each variant
+    (identity, gzip, br when the brotli module is installed) carries its own
+    strong ETag derived from the content hash, and responses use
+    Cache-Control: no-cache so browsers revalidate and get a 304 until the
+    shell is redeployed.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self._variants = {}  # encoding -> (body, etag)
+        self.reloads = 0
+        self.not_modified = 0
+        self.served = 0
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        st = os.stat(self.path)
+        signature = (st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            with open(self.path, "rb") as f:
+                body = f.read()
+            digest = hashlib.sha256(body).hexdigest()[:32]
+            variants = {"identity": (body, f'"{digest}"')}
+            variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gz"')
+            if brotli is not None:
+                variants["br"] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+            self._variants = variants
+            self._signature = signature
+            self.reloads += 1
+            print(f"[Shell] Loaded {self.path}: " + ", ".join(f"{enc} {len(b)} B" for enc, (b, _) in variants.items()))
+
+    def negotiate(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self._variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return "identity"
+
+    def response(self, request, status_code=200):
+        self.refresh()
+        encoding = self.negotiate(request.headers.get("accept-encoding"))
+        body, etag = self._variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": SHELL_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]:
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        self.served += 1
+        return Response(body, status_code=status_code, media_type="text/html", headers=headers)
+
+    def stats(self):
+        return {
+            "reloads": self.reloads,
+            "served": self.served,
+            "not_modified": self.not_modified,
+            "variants": {enc: len(body) for enc, (body, _) in self._variants.items()},
+        }
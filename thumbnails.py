@@ -0,0 +1,201 @@
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: without Pillow the original files are served as-is
+    Image = None
+
+# Variant widths per use; avatars are square crops, feed media keep their aspect ratio
+VARIANT_WIDTHS = {
+    "avatar": (64,),
+    "media": (480, 1080),
+}
+VARIANT_EXT = ".webp"
+VARIANT_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", "80"))
+
+
+def variant_path(path, width):
+    """uploads/cas/ab/cd/<hash>.png -> uploads/cas/ab/cd/<hash>.w480.webp"""
+    return f"{os.path.splitext(path)[0]}.w{width}{VARIANT_EXT}"
+
+
+def render_variants(src_path, kind, widths, quality=VARIANT_QUALITY):
+    """Runs in a worker process: writes one recompressed variant per width.
+
+    Images are never upscaled; a source narrower than a width is just
+    recompressed. Each file is written to a temp name and renamed, so a
+    variant is either complete or absent.
+    """
+    written = []
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+        for width in widths:
+            if kind == "avatar":
+                side = min(width, img.width, img.height)
+                out = ImageOps.fit(img, (side, side), Image.LANCZOS)
+            elif img.width > width:
+                out = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+            else:
+                out = img
+            dest = variant_path(src_path, width)
+            tmp = f"{dest}.{os.getpid()}.part"
+            out.save(tmp, "WEBP", quality=quality, method=4)
+            os.replace(tmp, dest)
+            written.append(width)
+    return written
+
+
+class ThumbnailPipeline:
+    """Generates resized variants of content-addressed images off the request path.
+
+    Renders run in a process pool (spawned, not forked, since the server is
+    multi-threaded) so decoding and resizing never compete with the event
+    loop or the DB threads for the GIL. variants() is what the feed code
+    calls: it only returns URLs of variants that exist, and schedules the
+    render for images uploaded before the pipeline existed. Disabled
+    (variants() returns {}) when Pillow is missing or THUMBNAIL_WORKERS=0.
+
+    Rendering is best effort: submit() never raises. If a worker dies (OOM
+    kill, crash) the pool is broken for good, so it is replaced and the
+    affected images are rendered again the next time they are asked for.
+    """
+
+    def __init__(self, media_store, workers=2, cache_size=10000):
+        self.media_store = media_store
+        self.workers = workers
+        self.cache_size = cache_size
+        self.enabled = Image is not None and workers > 0
+        self._executor = None
+        # (media_url, kind) -> {str(width): variant url}; LRU, so it stays bounded
+        self._ready = OrderedDict()
+        self._pending = set()  # (media_url, kind)
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.failed = 0
+        if Image is None:
+            print("[Thumbnails] Pillow is not installed; serving original images only.")
+
+    def _pool(self):
+        # Caller holds self._lock
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _drop_pool(self, broken):
+        # Caller holds self._lock. A broken pool has already lost its workers;
+        # the next _pool() call starts a fresh one
+        if self._executor is broken:
+            self._executor = None
+
+    def _urls(self, media_url, widths):
+        return {str(w): variant_path(media_url, w) for w in widths}
+
+    def submit(self, media_url, kind):
+        if not self.enabled or not self.media_store.is_managed(media_url):
+            return
+        key = (media_url, kind)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        src = self.media_store.path_for_url(media_url)
+        try:
+            executor, future = self._submit(src, kind)
+        except Exception as e:
+            with self._lock:
+                self._pending.discard(key)
+                self.failed += 1
+            print(f"[Thumbnails] Could not schedule {media_url}: {e}")
+            return
+        future.add_done_callback(lambda f: self._finished(key, f, executor))
+
+    def _submit(self, src, kind):
+        with self._lock:
+            executor = self._pool()
+        try:
+            return executor, executor.submit(render_variants, src, kind, VARIANT_WIDTHS[kind])
+        except BrokenProcessPool:
+            with self._lock:
+                self._drop_pool(executor)
+                executor = self._pool()
+            return executor, executor.submit(render_variants, src, kind, VARIANT_WIDTHS[kind])
+
+    def _remember(self, key, urls):
+        # Caller holds self._lock
+        self._ready[key] = urls
+        self._ready.move_to_end(key)
+        while len(self._ready) > self.cache_size:
+            self._ready.popitem(last=False)
+
+    def _finished(self, key, future, executor):
+        with self._lock:
+            self._pending.discard(key)
+            if isinstance(future.exception(), BrokenProcessPool):
+                # Not the image's fault: forget it, so variants() schedules it again
+                self._drop_pool(executor)
+                self.failed += 1
+                print(f"[Thumbnails] Worker pool died while rendering {key[0]}")
+                return
+            try:
+                widths = future.result()
+                self._remember(key, self._urls(key[0], widths))
+                self.rendered += 1
+            except Exception as e:
+                # Not an image Pillow can read; remember that so it isn't retried
+                self._remember(key, {})
+                self.failed += 1
+                print(f"[Thumbnails] Failed to render {key[0]}: {e}")
+
+    def variants(self, media_url, kind):
+        if not self.enabled or not self.media_store.is_managed(media_url):
+            return {}
+        key = (media_url, kind)
+        with self._lock:
+            ready = self._ready.get(key)
+            if ready is not None:
+                self._ready.move_to_end(key)
+                return ready
+            if key in self._pending:
+                return {}
+        urls = self._urls(media_url, VARIANT_WIDTHS[kind])
+        if all(os.path.exists(self.media_store.path_for_url(u)) for u in urls.values()):
+            with self._lock:
+                self._remember(key, urls)
+            return urls
+        self.submit(media_url, kind)
+        return {}
+
+    def discard(self, media_url):
+        """Drops the variants of a media file that has been garbage collected."""
+        with self._lock:
+            for kind in VARIANT_WIDTHS:
+                self._ready.pop((media_url, kind), None)
+        for widths in VARIANT_WIDTHS.values():
+            for width in widths:
+                try:
+                    os.unlink(self.media_store.path_for_url(variant_path(media_url, width)))
+                except FileNotFoundError:
+                    pass
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "workers": self.workers,
+                "cache_size": self.cache_size,
+                "ready": len(self._ready),
+                "pending": len(self._pending),
+                "rendered": self.rendered,
+                "failed": self.failed,
+            }
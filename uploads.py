@@ -0,0 +1,80 @@
+import asyncio
+import os
+import tempfile
+
+MB = 1024 * 1024
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_KB", "256")) * 1024
+
+# Per media class size limits (bytes), keyed by the major MIME type or the full type
+UPLOAD_LIMITS = {
+    "image": int(os.environ.get("UPLOAD_MAX_IMAGE_MB", "10")) * MB,
+    "video": int(os.environ.get("UPLOAD_MAX_VIDEO_MB", "100")) * MB,
+    "audio": int(os.environ.get("UPLOAD_MAX_AUDIO_MB", "25")) * MB,
+    "application/pdf": int(os.environ.get("UPLOAD_MAX_PDF_MB", "20")) * MB,
+}
+DEFAULT_UPLOAD_LIMIT = int(os.environ.get("UPLOAD_MAX_OTHER_MB", "10")) * MB
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def upload_limit_for(content_type):
+    content_type = (content_type or "").lower()
+    if content_type in UPLOAD_LIMITS:
+        return UPLOAD_LIMITS[content_type]
+    return UPLOAD_LIMITS.get(content_type.split("/")[0], DEFAULT_UPLOAD_LIMIT)
+
+
+def _write_chunk(f, chunk, on_chunk):
+    # Hashing runs here too, off the loop (hashlib releases the GIL for large chunks)
+    if on_chunk:
+        on_chunk(chunk)
+    f.write(chunk)
+
+
+def _finish(f, tmp_path, dest_path):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    os.replace(tmp_path, dest_path)
+
+
+async def save_upload(upload, dest_path, max_bytes=None, chunk_size=UPLOAD_CHUNK_SIZE, on_chunk=None):
+    """Copies an UploadFile to dest_path in bounded chunks without blocking the loop.
+
+    The data goes to a temp file in the destination directory, which is
+    fsynced and then renamed over dest_path. Readers therefore never see a
+    partial file. The size limit is enforced while streaming, and the temp
+    file is removed on any failure. Peak memory is one chunk regardless of
+    the upload size. on_chunk(bytes) is called for every chunk, e.g. to hash
+    the content. Returns the number of bytes written.
+    """
+    if max_bytes is None:
+        max_bytes = upload_limit_for(upload.content_type)
+    declared = getattr(upload, "size", None)
+    if declared is not None and declared > max_bytes:
+        raise UploadTooLarge(f"File exceeds the {max_bytes // MB} MB limit for {upload.content_type}.")
+
+    directory = os.path.dirname(dest_path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    f = os.fdopen(fd, "wb")
+    written = 0
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_bytes:
+                raise UploadTooLarge(f"File exceeds the {max_bytes // MB} MB limit for {upload.content_type}.")
+            await asyncio.to_thread(_write_chunk, f, chunk, on_chunk)
+        await asyncio.to_thread(_finish, f, tmp_path, dest_path)
+    except BaseException:
+        f.close()
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return written
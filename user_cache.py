@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Lookup keys other than id; each maps to the user's id
+USER_KEYS = ("username", "email")
+
+
+class InvalidationLog:
+    """Remembers when each key was last invalidated, so a read-through cache can
+    refuse a row that was read from the database before that invalidation.
+
+    Readers take mark() before the query and pass it to the cache's put().
+    Only the most recent `capacity` invalidations are kept; a mark older than
+    the last one forgotten is treated as stale for every key. Not thread-safe
+    on its own: the owning cache calls it under its lock.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self._clock = 0
+        self._floor = 0
+        self._last = OrderedDict()  # key -> clock value of its latest invalidation
+
+    def mark(self):
+        return self._clock
+
+    def bump(self, key):
+        self._clock += 1
+        self._last[key] = self._clock
+        self._last.move_to_end(key)
+        while len(self._last) > self.capacity:
+            self._floor = self._last.popitem(last=False)[1]
+
+    def changed_since(self, key, mark):
+        return mark < self._floor or self._last.get(key, 0) > mark
+
+
+class UserCache:
+    """Bounded read-through cache of users rows, addressable by id, username or email.
+
+    Each row is stored once (LRU by id) with secondary maps for username and
+    email. Writers call invalidate(user_id) after committing. Entries also
+    expire after `ttl` seconds, which bounds staleness when another process
+    changes a user. Only hits are cached, never "no such user", so a new
+    registration is visible immediately. get() returns copies, so callers
+    may modify what they receive. Readers pass put() the mark() they took
+    before querying, so a row read before an invalidation is not cached
+    again after it.
+    """
+
+    def __init__(self, capacity=5000, ttl=60.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._rows = OrderedDict()  # id -> (row, cached_at)
+        self._index = {key: {} for key in USER_KEYS}
+        self._invalidated = InvalidationLog(capacity)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def get(self, key, value):
+        with self._lock:
+            user_id = value if key == "id" else self._index[key].get(value)
+            entry = self._rows.get(user_id) if user_id is not None else None
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                if entry is not None:
+                    self._remove(user_id)
+                self.misses += 1
+                return None
+            self._rows.move_to_end(user_id)
+            self.hits += 1
+            return dict(entry[0])
+
+    def mark(self):
+        with self._lock:
+            return self._invalidated.mark()
+
+    def put(self, row, mark=None):
+        with self._lock:
+            if mark is not None and self._invalidated.changed_since(row["id"], mark):
+                self.stale_puts += 1
+                return
+            self._remove(row["id"])
+            self._rows[row["id"]] = (dict(row), time.monotonic())
+            for key in USER_KEYS:
+                if row.get(key) is not None:
+                    self._index[key][row[key]] = row["id"]
+            while len(self._rows) > self.capacity:
+                self._remove(next(iter(self._rows)))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            # Recorded even when nothing is cached: a read may be in flight
+            self._invalidated.bump(user_id)
+            if self._remove(user_id):
+                self.invalidations += 1
+
+    def _remove(self, user_id):
+        entry = self._rows.pop(user_id, None)
+        if entry is None:
+            return False
+        for key in USER_KEYS:
+            value = entry[0].get(key)
+            if self._index[key].get(value) == user_id:
+                del self._index[key][value]
+        return True
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "capacity": self.capacity,
+                "size": len(self._rows),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
@@ -0,0 +1,157 @@
+import threading
+import time
+from concurrent.futures import Future
+
+SAVEPOINT = "write_behind"
+
+
+class WriteBehindBuffer:
+    """Group commit for small independent writes (WRITE_BEHIND=1).
+
+    submit(fn, *args) queues fn(cur, *args) and returns a Future. A flusher
+    thread runs queued writes in one transaction on one pooled connection
+    and commits. It flushes once `max_batch` writes are waiting or the
+    oldest has waited `max_delay` seconds, so a burst of N writes costs one
+    commit (one fsync) instead of N. Each write runs inside its own
+    savepoint, so a write that raises fails only its own future. submit()
+    never blocks; async callers await the Future with asyncio.wrap_future,
+    so no thread sits idle waiting for the batch window.
+
+    Guarantees:
+      * A future resolves only after the COMMIT that contains its write has
+        returned, so an id read from it is durable. Nothing is
+        acknowledged early.
+      * Bounded staleness: a write becomes visible to other readers at most
+        `max_delay` plus one flush after submit(), as long as flushes are
+        shorter than `max_delay`. A write submitted during a longer flush
+        also waits for that flush to finish. stats() reports the worst
+        observed submit-to-commit time as max_wait_ms, next to max_flush_ms.
+        benchmarks/check_write_behind.py asserts these properties.
+      * Writes commit in submission order. The writer's own reads after
+        result() see the row, because result() returns after the commit.
+      * close() flushes everything that was accepted before returning.
+    """
+
+    def __init__(self, connect, max_batch=200, max_delay=0.01, begin_sql=None):
+        self.connect = connect
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        # SQLite needs an explicit BEGIN (IMMEDIATE takes the write lock up front)
+        # or the first RELEASE SAVEPOINT would commit on its own
+        self.begin_sql = begin_sql
+        self._pending = []  # (future, fn, args, submitted_at)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self.flushes = 0
+        self.writes = 0
+        self.failures = 0
+        self.max_batch_seen = 0
+        self.flush_seconds = 0.0
+        self.max_flush = 0.0
+        self.max_wait = 0.0
+
+    def start(self):
+        # Under the lock: concurrent submitters must not start a second flusher,
+        # which would break commit ordering
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind buffer is closed")
+            self._pending.append((future, fn, args, time.monotonic()))
+            if len(self._pending) >= self.max_batch or len(self._pending) == 1:
+                self._cond.notify()
+        self.start()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Hold the batch open until it is full or its oldest write is due
+                while not self._closed and len(self._pending) < self.max_batch:
+                    remaining = self._pending[0][3] + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            self._flush(batch)
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        outcomes = []
+        conn = self.connect()
+        try:
+            if conn is None:
+                raise RuntimeError("no database connection")
+            cur = conn.cursor()
+            if self.begin_sql:
+                cur.execute(self.begin_sql)
+            for future, fn, args, _ in batch:
+                cur.execute(f"SAVEPOINT {SAVEPOINT}")
+                try:
+                    result = fn(cur, *args)
+                except Exception as e:
+                    cur.execute(f"ROLLBACK TO SAVEPOINT {SAVEPOINT}")
+                    cur.execute(f"RELEASE SAVEPOINT {SAVEPOINT}")
+                    outcomes.append((future, None, e))
+                else:
+                    cur.execute(f"RELEASE SAVEPOINT {SAVEPOINT}")
+                    outcomes.append((future, result, None))
+            conn.commit()
+            cur.close()
+        except Exception as e:
+            print(f"[Write-behind Error] Flush of {len(batch)} writes failed: {e}")
+            if conn is not None:
+                conn.discard()
+            outcomes = [(future, None, e) for future, _, _, _ in batch]
+        else:
+            conn.close()
+        committed = time.monotonic()
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        # A flush lasts until its futures are resolved: writes submitted meanwhile wait for that too
+        finished = time.monotonic()
+        with self._cond:
+            self.flushes += 1
+            self.writes += len(batch)
+            self.failures += sum(1 for _, _, error in outcomes if error is not None)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.flush_seconds += finished - started
+            self.max_flush = max(self.max_flush, finished - started)
+            self.max_wait = max(self.max_wait, committed - batch[0][3])
+
+    def close(self, timeout=5.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_batch": self.max_batch,
+                "max_delay_ms": round(self.max_delay * 1000, 3),
+                "pending": len(self._pending),
+                "flushes": self.flushes,
+                "writes": self.writes,
+                "failures": self.failures,
+                "avg_batch": round(self.writes / self.flushes, 2) if self.flushes else None,
+                "max_batch_seen": self.max_batch_seen,
+                "avg_flush_ms": round(1000 * self.flush_seconds / self.flushes, 3) if self.flushes else None,
+                "max_flush_ms": round(1000 * self.max_flush, 3),
+                "max_wait_ms": round(1000 * self.max_wait, 3),
+            }